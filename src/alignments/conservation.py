@@ -0,0 +1,74 @@
+import numpy as np
+
+
+class ColumnStatistics:
+    """ Per-column statistics of an MSA, each held as an array with one value per alignment column """
+
+    def __init__(self, occupancy, gap_fraction, entropy, majority_residue, majority_identity):
+        """
+        Constructor
+        :param occupancy: number of non-gap characters
+        :param gap_fraction: fraction of sequences holding a gap
+        :param entropy: Shannon entropy (bits) of the non-gap characters, 0 for all-gap columns
+        :param majority_residue: most frequent non-gap character, as a uint8 ASCII code, the gap for all-gap columns
+        :param majority_identity: fraction of the non-gap characters that are the majority residue
+        """
+        self.occupancy = occupancy
+        self.gap_fraction = gap_fraction
+        self.entropy = entropy
+        self.majority_residue = majority_residue
+        self.majority_identity = majority_identity
+
+
+class Conservation:
+    """ Conservation is responsible for computing the per-column statistics of MSAs over the whole (organisms x
+    columns) uint8 matrix of an alignment at once """
+
+    GAP = ord("-")
+
+    def to_matrix(self, sequences):
+        """
+        Builds the uint8 (organisms x columns) matrix of the given aligned sequences
+        :param list sequences: aligned sequences, all of the same length
+        :return: uint8 matrix
+        """
+        if not sequences:
+            return np.zeros((0, 0), dtype=np.uint8)
+        joined = "".join(sequences).encode("ascii")
+        return np.frombuffer(joined, dtype=np.uint8).reshape(len(sequences), -1)
+
+    def occupancy(self, matrix):
+        """ Returns the number of non-gap characters of every column of the given matrix """
+        return (matrix != self.GAP).sum(axis=0)
+
+    def residue_counts(self, matrix):
+        """
+        Counts the non-gap characters of every column of the given matrix
+        :return: tuple of the (residues) uint8 alphabet and the (residues x columns) counts
+        """
+        alphabet = np.unique(matrix)
+        alphabet = alphabet[alphabet != self.GAP]
+        counts = np.vstack([(matrix == residue).sum(axis=0) for residue in alphabet]) if len(alphabet) else \
+            np.zeros((0, matrix.shape[1]), dtype=np.int64)
+        return alphabet, counts
+
+    def statistics(self, matrix):
+        """
+        Computes the per-column statistics of the given matrix
+        :param matrix: uint8 (organisms x columns) matrix
+        :return: ColumnStatistics
+        """
+        num_orgs, num_cols = matrix.shape
+        occupancy = self.occupancy(matrix)
+        gap_fraction = 1 - occupancy / num_orgs if num_orgs else np.zeros(num_cols)
+        alphabet, counts = self.residue_counts(matrix)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            freqs = np.where(occupancy > 0, counts / occupancy, 0)
+            entropy = -np.where(freqs > 0, freqs * np.log2(np.where(freqs > 0, freqs, 1)), 0).sum(axis=0)
+        if len(alphabet):
+            majority_residue = np.where(occupancy > 0, alphabet[counts.argmax(axis=0)], self.GAP).astype(np.uint8)
+            majority_identity = np.where(occupancy > 0, counts.max(axis=0) / np.maximum(occupancy, 1), 0)
+        else:
+            majority_residue = np.full(num_cols, self.GAP, dtype=np.uint8)
+            majority_identity = np.zeros(num_cols)
+        return ColumnStatistics(occupancy, gap_fraction, entropy, majority_residue, majority_identity)
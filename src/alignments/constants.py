@@ -71,6 +71,12 @@ class GeneFunctions:
     SULFOHYDROLASE = "Sulfohydrolase"
 
 
+class PlotModes:
+    """ A namespace of the rendering modes of the MSA frequency plots """
+    SEGMENTS = "segments"  # one vector segment per alignment column
+    BINNED = "binned"  # columns binned to the output pixel width and drawn as a single rasterized area
+
+
 # a map of gene to gene function, used for creating subplots of genes based on their function
 GENE_FUNCTIONS = {
     Genes.ACAN: GeneFunctions.CORE_PROTEIN,
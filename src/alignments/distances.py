@@ -0,0 +1,132 @@
+import os
+from concurrent import futures
+
+import numpy as np
+
+from src import fasta
+from src.alignments import conservation, store
+
+
+def _compute_file(path, chunk_size, packed):
+    """
+    Computes the pairwise distances of a single MSA, run by the worker processes of Distances.compute_files
+    :param str path: path of the FASTA MSA, or of its original FASTA file when packed
+    :param int chunk_size: number of columns compared at once
+    :param bool packed: whether to read the MSA from the memory-mapped alignments/store
+    :return: tuple of the filename and its PairwiseDistances
+    """
+    filename = os.path.basename(path)
+    if packed:
+        alignment = store.Store().open(filename)
+        orgs, matrix = alignment.organisms, alignment.matrix
+    else:
+        records = dict(fasta.Reader(path))
+        orgs, matrix = list(records.keys()), conservation.Conservation().to_matrix(list(records.values()))
+    return filename, Distances(chunk_size=chunk_size).compute(orgs, matrix)
+
+
+class PairwiseDistances:
+    """ The (organisms x organisms) distance matrices of an MSA, held as float32 arrays in the order of orgs """
+
+    def __init__(self, orgs, compared, identity, p_distance, gap_distance):
+        """
+        Constructor
+        :param list orgs: organisms of the rows and columns
+        :param compared: number of columns where both sequences hold a residue
+        :param identity: fraction of the compared columns holding the same residue, NaN when nothing is compared
+        :param p_distance: fraction of the compared columns holding different residues, NaN when nothing is compared
+        :param gap_distance: fraction of the columns where either sequence holds a residue that differ, a residue
+        against a gap counting as a difference, NaN when both sequences are all gaps
+        """
+        self.orgs = orgs
+        self.compared = compared
+        self.identity = identity
+        self.p_distance = p_distance
+        self.gap_distance = gap_distance
+
+
+class Distances:
+    """ Distances is responsible for computing pairwise identity and distance matrices of MSAs. Every pair of
+    organisms is compared at once through matrix products of one-hot encodings of the alignment matrix, computed over
+    chunks of columns so that memory stays bounded for large panels and long alignments """
+
+    GAP = conservation.Conservation.GAP
+
+    def __init__(self, chunk_size=4096):
+        """
+        Constructor
+        :param int chunk_size: number of columns compared at once
+        """
+        self.chunk_size = chunk_size
+
+    def counts(self, matrix):
+        """
+        Counts, for every pair of rows of an alignment matrix, the columns where both hold a residue, where both hold
+        the same residue, and where exactly one holds a gap
+        :param matrix: uint8 (organisms x columns) matrix
+        :return: tuple of three int64 (organisms x organisms) arrays
+        """
+        num_orgs = matrix.shape[0]
+        compared = np.zeros((num_orgs, num_orgs), dtype=np.int64)
+        matches = np.zeros((num_orgs, num_orgs), dtype=np.int64)
+        gap_mismatches = np.zeros((num_orgs, num_orgs), dtype=np.int64)
+        for start in range(0, matrix.shape[1], self.chunk_size):
+            chunk = np.asarray(matrix[:, start:start + self.chunk_size])
+            residues = (chunk != self.GAP).astype(np.float32)
+            both = residues @ residues.T
+            # counts of a chunk are at most chunk_size, so float32 products are exact
+            compared += np.rint(both).astype(np.int64)
+            one = residues @ (1 - residues).T
+            gap_mismatches += np.rint(one + one.T).astype(np.int64)
+            for residue in np.unique(chunk):
+                if residue == self.GAP:
+                    continue
+                one_hot = (chunk == residue).astype(np.float32)
+                matches += np.rint(one_hot @ one_hot.T).astype(np.int64)
+        return compared, matches, gap_mismatches
+
+    def compute(self, orgs, matrix):
+        """
+        Computes the pairwise distances of an MSA
+        :param list orgs: organisms of the rows of the matrix
+        :param matrix: uint8 (organisms x columns) matrix
+        :return: PairwiseDistances
+        """
+        compared, matches, gap_mismatches = self.counts(matrix)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            identity = (matches / compared).astype(np.float32)
+            gap_distance = ((compared - matches + gap_mismatches) / (compared + gap_mismatches)).astype(np.float32)
+        return PairwiseDistances(list(orgs), compared, identity, 1 - identity, gap_distance)
+
+    def compute_files(self, dir_path=None, workers=1, packed=False):
+        """
+        Computes the pairwise distances of every MSA of a directory
+        :param str dir_path: directory of the FASTA MSAs, defaults to src/data/alignments
+        :param int workers: number of worker processes, 1 computes in the current process, None uses all the CPUs
+        :param bool packed: whether to read the MSAs from the memory-mapped alignments/store
+        :return: dictionary of PairwiseDistances keyed on MSA filename
+        """
+        dir_path = dir_path if dir_path else os.path.join(os.getcwd(), "src", "data", "alignments")
+        paths = [os.path.join(dir_path, filename) for filename in os.listdir(dir_path)]
+        if workers == 1:
+            return dict(_compute_file(path, self.chunk_size, packed) for path in paths)
+        with futures.ProcessPoolExecutor(max_workers=workers) as pool:
+            return dict(pool.map(_compute_file, paths, [self.chunk_size] * len(paths), [packed] * len(paths)))
+
+    def save(self, distances, path=None):
+        """ Saves the given distances in a single .npz file, with the organisms and matrices of every MSA """
+        path = path if path else os.path.join(os.getcwd(), "src", "data", "alignments_distances.npz")
+        arrays = {}
+        for filename, pairwise in distances.items():
+            gene = os.path.splitext(filename)[0]
+            arrays["{}/orgs".format(gene)] = np.array(pairwise.orgs)
+            arrays["{}/compared".format(gene)] = pairwise.compared.astype(np.int32)
+            arrays["{}/identity".format(gene)] = pairwise.identity
+            arrays["{}/p_distance".format(gene)] = pairwise.p_distance
+            arrays["{}/gap_distance".format(gene)] = pairwise.gap_distance
+        np.savez_compressed(path, **arrays)
+
+
+if __name__ == "__main__":
+    distances = Distances()
+    distances.save(distances.compute_files(workers=None))
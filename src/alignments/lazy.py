@@ -0,0 +1,65 @@
+import collections
+import collections.abc
+
+
+class LazyMapping(collections.abc.Mapping):
+    """ A read-only mapping whose values are only loaded on first access and held in a least-recently-used cache
+    bounded by a number of entries and/or a number of bytes, so iterating over many large values runs in constant
+    memory """
+
+    def __init__(self, keys, load, max_entries=None, max_bytes=None, sizeof=None):
+        """
+        Constructor
+        :param keys: the keys of the mapping, known upfront
+        :param load: function that builds the value of a key
+        :param int max_entries: maximum number of cached values, unbounded when not given
+        :param int max_bytes: maximum total size of the cached values, unbounded when not given
+        :param sizeof: function that returns the size in bytes of a value, required by max_bytes
+        """
+        self._keys = list(keys)
+        self._key_set = set(self._keys)
+        self._load = load
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._sizeof = sizeof if sizeof else (lambda value: 0)
+        self._cache = collections.OrderedDict()  # key -> (value, size), least recently used first
+        self.cached_bytes = 0
+
+    def __getitem__(self, key):
+        if key not in self._key_set:
+            raise KeyError(key)
+        if key in self._cache:
+            self._cache.move_to_end(key)
+            return self._cache[key][0]
+        value = self._load(key)
+        size = self._sizeof(value)
+        self._cache[key] = (value, size)
+        self.cached_bytes += size
+        self._evict()
+        return value
+
+    def __iter__(self):
+        return iter(self._keys)
+
+    def __len__(self):
+        return len(self._keys)
+
+    def __contains__(self, key):
+        return key in self._key_set
+
+    def _evict(self):
+        """ Drops the least recently used values until the cache is within its bounds, always keeping the latest """
+        while len(self._cache) > 1 and (
+                (self.max_entries is not None and len(self._cache) > self.max_entries) or
+                (self.max_bytes is not None and self.cached_bytes > self.max_bytes)):
+            _, (_, size) = self._cache.popitem(last=False)
+            self.cached_bytes -= size
+
+    def cached(self):
+        """ Returns the keys whose values are currently cached, least recently used first """
+        return list(self._cache.keys())
+
+    def clear(self):
+        """ Drops all the cached values """
+        self._cache.clear()
+        self.cached_bytes = 0
@@ -1,12 +1,54 @@
 import os
+from concurrent import futures
 
 from matplotlib import collections as matcoll
 import matplotlib.pyplot as plt
+import numpy as np
 
-from src.alignments import constants
+from src import fasta
+from src.alignments import conservation, constants, lazy, store
 
 plt.style.use('seaborn-white')
 
+PLOT_DPI = 150
+
+
+def _bin_frequencies(values, num_bins):
+    """
+    Bins the per-column frequencies of an MSA
+    :param values: frequencies indexed on column
+    :param int num_bins: maximum number of bins, e.g. the output pixel width
+    :return: tuple of the first column of every bin, followed by the number of columns, and the max and mean
+    frequencies of every bin
+    """
+    values = np.asarray(values)
+    edges = np.unique(np.linspace(0, len(values), min(num_bins, len(values)) + 1).astype(np.int64))
+    if len(edges) < 2:
+        return edges, np.zeros(0), np.zeros(0)
+    maxes = np.maximum.reduceat(values, edges[:-1])
+    means = np.add.reduceat(values, edges[:-1]) / np.diff(edges)
+    return edges, maxes, means
+
+
+def _render_binned_frequencies(frequencies, path, fig_size):
+    """
+    Renders the frequency plots of a list of (title, frequencies) tuples, one subplot per MSA, into a PDF. The columns
+    are binned to the pixel width of the figure and every MSA is drawn as a single rasterized area of the bin maxima
+    """
+    fig = plt.figure(figsize=fig_size)
+    fig.subplots_adjust(hspace=2)
+    num_bins = int(fig_size[0] * PLOT_DPI)
+    for idx, (title, values) in enumerate(frequencies):
+        edges, maxes, _ = _bin_frequencies(values, num_bins)
+        ax = fig.add_subplot(len(frequencies), 1, idx + 1)
+        if len(maxes):
+            ax.fill_between(edges, 0, np.append(maxes, maxes[-1]), step="post", linewidth=0, rasterized=True)
+        ax.set_xlim(0, len(values))
+        ax.set_yticks([])
+        ax.set_title(title)
+    fig.savefig(path, format="pdf", dpi=PLOT_DPI, bbox_inches='tight')
+    plt.close(fig)
+
 
 class Parser:
     """ Parser is responsible for parsing the multiple sequence alignment files from data/alignments """
@@ -14,11 +56,19 @@ class Parser:
     GENE_NAME_IDX = 0  # index of the gene name when parsing gene_filename.txt
     ALL = "all_genes"  # whether to plot all genes when using build_frequency_plots_by_function
 
-    def __init__(self):
-        """ Constructor """
+    def __init__(self, packed=False, max_genes=None, max_bytes=None):
+        """
+        Constructor
+        :param bool packed: whether to read the MSAs from the memory-mapped alignments/store instead of the FASTA files
+        :param int max_genes: maximum number of parsed MSAs held in memory at once, unbounded when not given
+        :param int max_bytes: maximum number of bytes of parsed MSAs held in memory at once, unbounded when not given
+        """
+        self.store = store.Store() if packed else None
+        self.conservation = conservation.Conservation()
         self.alignment_file_paths = self._build_alignment_paths()
-        self.alignments = self._parse_alignments()
-        self.frequencies = self._build_frequencies()
+        # MSAs and their frequencies are only parsed when a gene is first accessed
+        self.alignments = self._parse_alignments(max_genes, max_bytes)
+        self.frequencies = self._build_frequencies(max_genes)
         self.frequencies_by_function = self._build_frequencies_by_function()
 
     def _get_alignment_filenames(self):
@@ -30,41 +80,37 @@ class Parser:
         alignment_file_names = self._get_alignment_filenames()
         return [os.path.join(os.getcwd(), "src", "data", "alignments", afn) for afn in alignment_file_names]
 
-    def _parse_alignments(self):
-        """ Parses the MSAs to clean up the 60 character break added by ClustalW """
-        final = {}
-        for afp in self.alignment_file_paths:
-            filename = afp.split("/")[-1]  # the filename.txt is sufficient
-            if not final.get(filename):
-                final[filename] = {}
-            with open(afp, "r") as f:
-                org = ""  # helps keep track of the last organism
-                for line in f.readlines():
-                    if not line.strip():
-                        continue  # it can happen that we have empty lines
-                    line = line.strip("\n")
-                    if ">" in line:
-                        org = line.strip(">")
-                        if not final.get(filename).get(org):
-                            final[filename][org] = ""
-                    else:
-                        final[filename][org] = final.get(filename).get(org) + line
-        return final
-
-    def _build_frequencies(self):
-        """ Builds a list of lists containing tuples indicating the number of characters per alignment column. This is
-        used for building a simple visualization of the generated MSAs """
-        freqs = {}
-        for gene in self.alignments.keys():
-            if not freqs.get(gene):
-                freqs[gene] = []
-            for i in range(len(list(self.alignments.get(gene).values())[0])):  # all alignments have the same length
-                freq_i = 0
-                for seq in self.alignments.get(gene).values():
-                    if seq[i] != "-":
-                        freq_i = freq_i + 1
-                freqs[gene].append((i, freq_i))
-        return freqs
+    def _parse_alignment(self, filename):
+        """ Parses a single MSA to clean up the 60 character break added by ClustalW """
+        if self.store:
+            return self.store.open(filename).rows()  # uint8 views of the memory-mapped matrix, decoded on output
+        return dict(fasta.Reader(os.path.join(os.getcwd(), "src", "data", "alignments", filename)))
+
+    def _parse_alignments(self, max_genes=None, max_bytes=None):
+        """ Builds the lazy mapping of MSAs keyed on filename, the filename.txt is sufficient """
+        filenames = [afp.split("/")[-1] for afp in self.alignment_file_paths]
+        return lazy.LazyMapping(filenames, self._parse_alignment, max_entries=max_genes, max_bytes=max_bytes,
+                                sizeof=lambda alignment: sum(len(seq) for seq in alignment.values()))
+
+    def _get_alignment_matrix(self, gene):
+        """ Returns the uint8 (organisms x columns) matrix of the MSA of the given gene """
+        if self.store:
+            return self.store.open(gene).matrix
+        return self.conservation.to_matrix(list(self.alignments.get(gene).values()))
+
+    def _build_frequencies(self, max_genes=None):
+        """ Builds the lazy mapping of the number of non-gap characters per alignment column of every gene, as arrays
+        indexed on column. This is used for building a simple visualization of the generated MSAs """
+        return lazy.LazyMapping(self.alignments.keys(),
+                                lambda gene: self.conservation.occupancy(self._get_alignment_matrix(gene)),
+                                max_entries=max_genes)
+
+    def build_conservation(self):
+        """
+        Builds the per-column conservation statistics of every gene
+        :return: dictionary of conservation.ColumnStatistics keyed on gene
+        """
+        return {gene: self.conservation.statistics(self._get_alignment_matrix(gene)) for gene in self.alignments.keys()}
 
     def _build_frequencies_by_function(self):
         """ Builds a mapping of gene functions to gene frequencies used for grouping visualizations in MSAs """
@@ -73,35 +119,45 @@ class Parser:
             g = gene.split("_")[self.GENE_NAME_IDX]
             group = constants.GENE_FUNCTIONS.get(g)
             if not groups.get(group):
-                groups[group] = {}
-            groups[group][gene] = self.frequencies.get(gene)
-        return groups
+                groups[group] = []
+            groups[group].append(gene)
+        # the frequencies are cached by self.frequencies, so the groups do not hold on to them
+        return {group: lazy.LazyMapping(genes, self.frequencies.__getitem__, max_entries=1)
+                for group, genes in groups.items()}
 
     def build_block_alignments(self):
         """ Reads the parsed multiple sequence alignments and prints to a file in block format """
         for align_key in self.alignments.keys():
             # I do not remember why I've put this in src/data/organisms... -.-
             path = os.path.join(os.getcwd(), "src", "data", "organisms", align_key)
-            with open(path, "w") as f:
-                for org_key in self.alignments.get(align_key).keys():
-                    f.write(">{}\n".format(org_key))
-                    f.write("{}\n".format(self.alignments.get(align_key).get(org_key).replace("-", "")))
+            with fasta.Writer(path) as writer:
+                for org_key, seq in self.alignments.get(align_key).items():
+                    if not isinstance(seq, str):  # packed rows
+                        seq = seq.tobytes().decode("ascii")
+                    writer.write(org_key, seq.replace("-", ""))
 
-    def build_frequency_plots(self, subset=False, subset_num=0):
+    def build_frequency_plots(self, subset=False, subset_num=0, mode=constants.PlotModes.BINNED):
         """
         Builds the frequency plots associated with the MSAs
         :param subset: whether to respect the subset_num parameter
         :param subset_num: the number of genes to plot as a subset of the total
+        :param str mode: rendering mode of the plots, one of constants.PlotModes
         """
+        path = "src/data/visualizations/MSAs.pdf"
+        if mode == constants.PlotModes.BINNED:
+            genes = list(self.frequencies.keys())
+            genes = genes[:subset_num] if subset else genes
+            frequencies = [(gene.split('_')[self.GENE_NAME_IDX], self.frequencies.get(gene)) for gene in genes]
+            _render_binned_frequencies(frequencies, path, (8, 40))
+            return
         num_plots = len(list(self.frequencies.keys()))
         fig = plt.figure(figsize=(8, 40))  # these were figured out by trial and error
         fig.subplots_adjust(hspace=2)
         for idx, gene in enumerate(list(self.frequencies.keys())):
             if subset and idx == subset_num:
                 break
-            values = self.frequencies.get(gene)
-            x_vals = [v[0] for v in values]
-            y_vals = [v[1] for v in values]
+            y_vals = self.frequencies.get(gene)
+            x_vals = range(len(y_vals))
             lines = []
             for i in range(len(x_vals)):
                 pair = [(x_vals[i], 0), (x_vals[i], y_vals[i])]
@@ -114,20 +170,25 @@ class Parser:
             plt.yticks([])
             title = "{}".format(gene.split('_')[self.GENE_NAME_IDX])
             plt.title(title)
-        path = "src/data/visualizations/MSAs.pdf"
         plt.savefig(path, format="pdf", quality=95, bbox_inches='tight')
 
-    def build_frequency_plots_by_function(self):
-        """ Builds the frequency plots associated with the MSAs. Plots are grouped
-        based on gene function """
+    def build_frequency_plots_by_function(self, mode=constants.PlotModes.BINNED, workers=1):
+        """
+        Builds the frequency plots associated with the MSAs. Plots are grouped
+        based on gene function
+        :param str mode: rendering mode of the plots, one of constants.PlotModes
+        :param int workers: number of processes rendering the binned function groups, None uses all the CPUs
+        """
+        if mode == constants.PlotModes.BINNED:
+            self._build_binned_frequency_plots_by_function(workers)
+            return
         for i, func in enumerate(self.frequencies_by_function):
             num_plots = len(list(self.frequencies_by_function.get(func)))
             fig = plt.figure(figsize=(8, num_plots * .8))
             fig.subplots_adjust(hspace=2)
             for idx, gene in enumerate(list(self.frequencies_by_function.get(func).keys())):
-                values = self.frequencies_by_function.get(func).get(gene)
-                x_vals = [v[0] for v in values]
-                y_vals = [v[1] for v in values]
+                y_vals = self.frequencies_by_function.get(func).get(gene)
+                x_vals = range(len(y_vals))
                 lines = []
                 for i in range(len(x_vals)):
                     pair = [(x_vals[i], 0), (x_vals[i], y_vals[i])]
@@ -143,6 +204,22 @@ class Parser:
             path = "src/data/visualizations/alignments/{}_msa.pdf".format(func.lower())
             plt.savefig(path, format="pdf", quality=95, bbox_inches='tight')
 
+    def _build_binned_frequency_plots_by_function(self, workers=1):
+        """ Renders the binned frequency plots of every function group, spread over worker processes when workers is
+        not 1 """
+        tasks = []
+        for func, genes in self.frequencies_by_function.items():
+            frequencies = [(gene.split('_')[self.GENE_NAME_IDX], genes.get(gene)) for gene in genes.keys()]
+            path = "src/data/visualizations/alignments/{}_msa.pdf".format(func.lower())
+            tasks.append((frequencies, path, (8, len(frequencies) * .8)))
+        if workers == 1:
+            for task in tasks:
+                _render_binned_frequencies(*task)
+            return
+        with futures.ProcessPoolExecutor(max_workers=workers) as pool:
+            for result in [pool.submit(_render_binned_frequencies, *task) for task in tasks]:
+                result.result()  # surfaces the errors of the workers
+
 
 if __name__ == "__main__":
     parser = Parser()
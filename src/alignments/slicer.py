@@ -0,0 +1,188 @@
+import json
+import os
+
+import numpy as np
+
+from src import exceptions
+
+
+class AlignmentIndex:
+    """ A byte-offset index over a FASTA MSA with fixed-width sequence lines, such as the 60 character per line files
+    in data/alignments. For every record it holds the offset of its first sequence line, which together with the line
+    width is enough to seek to any column """
+
+    HEADER = b">"
+
+    def __init__(self, source, size, mtime, line_width, records):
+        """
+        Constructor
+        :param str source: path of the indexed FASTA file
+        :param int size: size of the indexed file, used to tell when the index is stale
+        :param float mtime: modification time of the indexed file, used to tell when the index is stale
+        :param int line_width: number of characters per sequence line
+        :param dict records: (offset, length) of the sequence of every record, keyed on record name
+        """
+        self.source = source
+        self.size = size
+        self.mtime = mtime
+        self.line_width = line_width
+        self.records = records
+
+    @classmethod
+    def build(cls, path):
+        """ Indexes the given FASTA file, raises MalformedAlignmentException when its lines are not of a fixed width """
+        records, line_width = {}, None
+        name, seq_offset, seq_len, last_len = None, None, 0, None
+        offset = 0
+        with open(path, "rb") as f:
+            for line in f:
+                line_offset, offset = offset, offset + len(line)
+                stripped = line.rstrip(b"\r\n")
+                if stripped.startswith(cls.HEADER):
+                    if name is not None:
+                        records[name] = (seq_offset, seq_len)
+                    name, seq_offset, seq_len, last_len = stripped[1:].strip().decode("ascii"), offset, 0, None
+                    continue
+                if name is None or not stripped:
+                    continue
+                if len(line) != len(stripped) + 1:
+                    raise exceptions.MalformedAlignmentException("{} does not use \\n line endings".format(path))
+                if last_len is not None and last_len != line_width:
+                    raise exceptions.MalformedAlignmentException("{} does not have fixed-width lines".format(path))
+                if line_width is None:
+                    line_width = len(stripped)
+                if len(stripped) > line_width or line_offset != seq_offset + seq_len // line_width * (line_width + 1):
+                    raise exceptions.MalformedAlignmentException("{} does not have fixed-width lines".format(path))
+                seq_len += len(stripped)
+                last_len = len(stripped)
+            if name is not None:
+                records[name] = (seq_offset, seq_len)
+        stat = os.stat(path)
+        return cls(path, stat.st_size, stat.st_mtime, line_width, records)
+
+    @classmethod
+    def load(cls, path):
+        """ Loads an index saved with save """
+        with open(path, "r") as f:
+            data = json.load(f)
+        records = {name: tuple(record) for name, record in data.get("records").items()}
+        return cls(data.get("source"), data.get("size"), data.get("mtime"), data.get("line_width"), records)
+
+    def save(self, path):
+        """ Saves the index as JSON """
+        with open(path, "w") as f:
+            json.dump({
+                "source": self.source,
+                "size": self.size,
+                "mtime": self.mtime,
+                "line_width": self.line_width,
+                "records": self.records,
+            }, f)
+
+    def is_stale(self):
+        """ Returns whether the indexed file changed since it was indexed """
+        if not os.path.exists(self.source):
+            return True
+        stat = os.stat(self.source)
+        return stat.st_size != self.size or stat.st_mtime != self.mtime
+
+    def read(self, f, name, start, end):
+        """
+        Reads a column range of the sequence of a record
+        :param f: the indexed file, opened in binary mode
+        :param str name: record name
+        :param int start: first column, inclusive
+        :param int end: last column, exclusive
+        :return: the slice of the sequence as bytes
+        """
+        seq_offset, seq_len = self.records[name]
+        start, end = max(start, 0), min(end, seq_len)
+        if start >= end:
+            return b""
+        first_line, last_line = start // self.line_width, (end - 1) // self.line_width
+        f.seek(seq_offset + first_line * (self.line_width + 1))
+        chunk = f.read((last_line - first_line + 1) * (self.line_width + 1)).replace(b"\n", b"")
+        skip = start - first_line * self.line_width
+        return chunk[skip:skip + end - start]
+
+
+class Slicer:
+    """ Slicer is responsible for random access to MSAs by column range and set of organisms. It seeks directly to the
+    lines holding the requested columns through an AlignmentIndex, built once per file and cached as JSON in
+    data/alignments_index so that the data/alignments directory only holds MSAs """
+
+    INDEX_EXTENSION = ".idx.json"
+
+    def __init__(self, dir_path=None, index_dir=None):
+        """
+        Constructor
+        :param str dir_path: directory of the FASTA MSAs, defaults to src/data/alignments
+        :param str index_dir: directory of the cached indices, defaults to src/data/alignments_index
+        """
+        self.dir_path = dir_path if dir_path else os.path.join(os.getcwd(), "src", "data", "alignments")
+        self.index_dir = index_dir if index_dir else os.path.join(os.getcwd(), "src", "data", "alignments_index")
+        self.indices = {}
+
+    def _get_index_path(self, filename):
+        """ Returns the path of the cached index of the given MSA filename """
+        return os.path.join(self.index_dir, os.path.splitext(filename)[0] + self.INDEX_EXTENSION)
+
+    def get_index(self, filename):
+        """
+        Returns the index of the given MSA filename, loaded from the cache or built and cached if missing or stale
+        :param str filename: filename of the MSA, e.g. Acan_ENSG00000157766.txt
+        :return: AlignmentIndex
+        """
+        index = self.indices.get(filename)
+        if index and not index.is_stale():
+            return index
+        index_path = self._get_index_path(filename)
+        index = AlignmentIndex.load(index_path) if os.path.exists(index_path) else None
+        if not index or index.is_stale():
+            index = AlignmentIndex.build(os.path.join(self.dir_path, filename))
+            os.makedirs(self.index_dir, exist_ok=True)
+            index.save(index_path)
+        self.indices[filename] = index
+        return index
+
+    def organisms(self, filename):
+        """ Returns the organisms of the given MSA filename, in file order """
+        return list(self.get_index(filename).records.keys())
+
+    def length(self, filename):
+        """ Returns the number of columns of the given MSA filename """
+        records = self.get_index(filename).records
+        return max((seq_len for _, seq_len in records.values()), default=0)
+
+    def slice(self, filename, start=0, end=None, orgs=None):
+        """
+        Reads a column range of an MSA for a set of organisms
+        :param str filename: filename of the MSA, e.g. Acan_ENSG00000157766.txt
+        :param int start: first column, inclusive
+        :param int end: last column, exclusive, defaults to the end of the alignment
+        :param orgs: organisms to read, in the order they should be returned, defaults to all organisms in file order
+        :return: dictionary of the sliced sequences as str keyed on organism, organisms absent from the MSA are left out
+        """
+        index = self.get_index(filename)
+        end = end if end is not None else self.length(filename)
+        orgs = orgs if orgs is not None else index.records.keys()
+        final = {}
+        with open(index.source, "rb") as f:
+            for org in orgs:
+                if org in index.records:
+                    final[org] = index.read(f, org, start, end).decode("ascii")
+        return final
+
+    def slice_matrix(self, filename, start=0, end=None, orgs=None):
+        """
+        Reads a column range of an MSA for a set of organisms as a matrix, see slice
+        :return: tuple of the list of organisms and the uint8 (organisms x columns) matrix of their sliced sequences
+        """
+        sliced = self.slice(filename, start, end, orgs)
+        if not sliced:
+            return [], np.zeros((0, 0), dtype=np.uint8)
+        lengths = {len(seq) for seq in sliced.values()}
+        if len(lengths) > 1:
+            raise exceptions.MalformedAlignmentException("{} holds sequences of different lengths".format(filename))
+        joined = "".join(sliced.values()).encode("ascii")
+        return list(sliced.keys()), np.frombuffer(joined, dtype=np.uint8).reshape(len(sliced), -1)
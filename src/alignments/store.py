@@ -0,0 +1,164 @@
+import json
+import os
+import struct
+
+import numpy as np
+
+from src import exceptions, fasta
+
+
+class PackedAlignment:
+    """ A memory-mapped MSA, held as a contiguous uint8 (organisms x columns) matrix of ASCII characters """
+
+    def __init__(self, header, matrix):
+        """
+        Constructor
+        :param dict header: metadata of the alignment (gene, gene_id, source, organisms)
+        :param matrix: (organisms x columns) uint8 matrix
+        """
+        self.header = header
+        self.gene = header.get("gene")
+        self.organisms = header.get("organisms")
+        self.org_idx = {org: idx for idx, org in enumerate(self.organisms)}
+        self.matrix = matrix
+
+    def row(self, org):
+        """ Returns the zero-copy uint8 view of the aligned sequence of the given organism """
+        return np.asarray(self.matrix[self.org_idx[org]])
+
+    def sequence(self, org):
+        """ Returns the aligned sequence of the given organism as a str """
+        return self.row(org).tobytes().decode("ascii")
+
+    def rows(self, names=None):
+        """
+        Returns the zero-copy uint8 views of the aligned sequences, keyed on organism. The views can be handed to
+        anything that takes a sequence as str, bytes, or uint8 array without decoding the matrix
+        :param names: set of organisms to keep, all organisms are kept when not given
+        """
+        return {org: self.row(org) for org in self.organisms if names is None or org in names}
+
+    def sequences(self, names=None):
+        """
+        Returns the aligned sequences decoded as str, keyed on organism, for the callers that need text, see rows
+        :param names: set of organisms to keep, all organisms are kept when not given
+        """
+        return {org: self.sequence(org) for org in self.organisms if names is None or org in names}
+
+
+class Store:
+    """ Store is responsible for converting the MSAs of data/alignments into packed binary files and memory-mapping
+    them. Each file holds a magic string, the length of a JSON header, the header, and the uint8 matrix aligned to
+    MATRIX_ALIGNMENT bytes, so that opening an alignment is near-instant and its pages are shared across processes.
+    The header records the size and modification time of the source FASTA file, and a packed file that no longer
+    matches its source is converted again when opened """
+
+    MAGIC = b"PGALN001"
+    EXTENSION = ".pgaln"
+    MATRIX_ALIGNMENT = 64
+    GENE_NAME_IDX = 0
+    GENE_ID_IDX = 1
+
+    def __init__(self, dir_path=None, src_dir=None):
+        """
+        Constructor
+        :param str dir_path: directory of the packed alignments, defaults to src/data/alignments_packed
+        :param str src_dir: directory of the FASTA MSAs the packed alignments are converted from, defaults to
+        src/data/alignments
+        """
+        self.dir_path = dir_path if dir_path else os.path.join(os.getcwd(), "src", "data", "alignments_packed")
+        self.src_dir = src_dir if src_dir else os.path.join(os.getcwd(), "src", "data", "alignments")
+
+    def _get_packed_path(self, filename):
+        """ Returns the path of the packed file of the given MSA filename """
+        return os.path.join(self.dir_path, os.path.splitext(filename)[0] + self.EXTENSION)
+
+    def _get_source_stamp(self, path):
+        """ Returns the (size, modification time in ns) of the given source file """
+        stat = os.stat(path)
+        return [stat.st_size, stat.st_mtime_ns]
+
+    def convert(self, src_dir=None):
+        """
+        Converts every MSA of the given directory into a packed file
+        :param str src_dir: directory of the FASTA MSAs, defaults to the store source directory
+        """
+        src_dir = src_dir if src_dir else self.src_dir
+        for filename in os.listdir(src_dir):
+            self.convert_file(os.path.join(src_dir, filename))
+
+    def convert_file(self, path):
+        """ Converts a single FASTA MSA into a packed file """
+        filename = os.path.basename(path)
+        os.makedirs(self.dir_path, exist_ok=True)
+        stamp = self._get_source_stamp(path)
+        records = list(fasta.Reader(path, as_bytes=True))
+        lengths = {len(seq) for _, seq in records}
+        if len(lengths) > 1:
+            raise exceptions.MalformedAlignmentException("{} holds sequences of different lengths".format(filename))
+        split = os.path.splitext(filename)[0].split("_")
+        header = {
+            "gene": split[self.GENE_NAME_IDX],
+            "gene_id": split[self.GENE_ID_IDX] if len(split) > self.GENE_ID_IDX else None,
+            "source": filename,
+            "source_stamp": stamp,
+            "organisms": [name.decode("ascii") for name, _ in records],
+        }
+        encoded = json.dumps(header).encode("utf-8")
+        offset = len(self.MAGIC) + 8 + len(encoded)
+        padding = -offset % self.MATRIX_ALIGNMENT
+        packed_path = self._get_packed_path(filename)
+        # written aside and moved in place, so that readers never map a partially written file
+        tmp_path = "{}.{}.tmp".format(packed_path, os.getpid())
+        with open(tmp_path, "wb") as out:
+            out.write(self.MAGIC)
+            out.write(struct.pack("<Q", len(encoded)))
+            out.write(encoded)
+            out.write(b"\0" * padding)
+            for _, seq in records:
+                out.write(seq)
+        os.replace(tmp_path, packed_path)
+
+    def filenames(self):
+        """ Returns the MSA filenames held by the store, with their original .txt extension """
+        if not os.path.isdir(self.dir_path):
+            return []
+        return [os.path.splitext(f)[0] + ".txt" for f in os.listdir(self.dir_path) if f.endswith(self.EXTENSION)]
+
+    def _read_header(self, path):
+        """ Reads the header of the given packed file, returns a tuple of the header and its length in bytes """
+        with open(path, "rb") as f:
+            if f.read(len(self.MAGIC)) != self.MAGIC:
+                raise exceptions.MalformedAlignmentException("{} is not a packed alignment".format(path))
+            header_len = struct.unpack("<Q", f.read(8))[0]
+            return json.loads(f.read(header_len).decode("utf-8")), header_len
+
+    def open(self, filename):
+        """
+        Memory-maps the packed file of the given MSA filename. The file is converted first when it is missing or when
+        the source FASTA file changed since it was packed
+        :param str filename: filename of the MSA, e.g. Acan_ENSG00000157766.txt
+        :return: PackedAlignment
+        """
+        path = self._get_packed_path(filename)
+        src_path = os.path.join(self.src_dir, filename)
+        header, header_len = self._read_header(path) if os.path.exists(path) else (None, 0)
+        if os.path.exists(src_path) and (header is None or
+                                         header.get("source_stamp") != self._get_source_stamp(src_path)):
+            self.convert_file(src_path)
+            header, header_len = self._read_header(path)
+        elif header is None:
+            raise exceptions.MalformedAlignmentException("{} is not packed and has no source".format(filename))
+        offset = len(self.MAGIC) + 8 + header_len
+        offset += -offset % self.MATRIX_ALIGNMENT
+        num_orgs = len(header.get("organisms"))
+        if not num_orgs:
+            return PackedAlignment(header, np.zeros((0, 0), dtype=np.uint8))
+        num_cols = (os.path.getsize(path) - offset) // num_orgs
+        matrix = np.memmap(path, dtype=np.uint8, mode="r", offset=offset, shape=(num_orgs, num_cols))
+        return PackedAlignment(header, matrix)
+
+
+if __name__ == "__main__":
+    store = Store()
+    store.convert()
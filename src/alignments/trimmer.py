@@ -0,0 +1,150 @@
+import json
+import os
+
+import numpy as np
+
+from src import fasta
+from src.alignments import conservation, distances
+
+
+class Flags:
+    """ A namespace of the reasons a sequence is flagged by the Trimmer """
+    GAPPY = "gappy"
+    DIVERGENT = "divergent"
+
+
+class TrimmedAlignment:
+    """ An MSA after QC, with the map of its columns back to the columns of the original MSA """
+
+    def __init__(self, orgs, matrix, columns, num_columns, flags):
+        """
+        Constructor
+        :param list orgs: organisms of the rows of the matrix
+        :param matrix: uint8 (organisms x kept columns) matrix
+        :param columns: int32 array holding the original column of every kept column
+        :param int num_columns: number of columns of the original MSA
+        :param dict flags: list of Flags of the flagged organisms, keyed on organism
+        """
+        self.orgs = orgs
+        self.num_columns = num_columns
+        self.matrix = matrix
+        self.columns = columns
+        self.flags = flags
+
+    def sequences(self):
+        """ Returns the trimmed sequences as str, keyed on organism """
+        return {org: self.matrix[idx].tobytes().decode("ascii") for idx, org in enumerate(self.orgs)}
+
+
+class Trimmer:
+    """ Trimmer is responsible for the QC of the MSAs in data/alignments. It drops the columns whose gap fraction is
+    above a threshold and flags the sequences that are mostly gaps or that are much more divergent than the rest of
+    the panel, all over the uint8 matrix of an alignment at once """
+
+    def __init__(self, max_gap_fraction=0.5, max_sequence_gap_fraction=0.9, divergence_mads=5, codons=False,
+                 drop_flagged=False):
+        """
+        Constructor
+        :param float max_gap_fraction: columns with a larger fraction of gaps are dropped
+        :param float max_sequence_gap_fraction: sequences with a larger fraction of gaps, after trimming, are flagged
+        :param float divergence_mads: sequences whose mean p-distance to the others is more than this many median
+        absolute deviations above the median are flagged
+        :param bool codons: whether to drop whole column triplets, based on their mean gap fraction, so that the
+        reading frame of the kept columns is preserved
+        :param bool drop_flagged: whether to leave the flagged sequences out of the trimmed MSAs
+        """
+        self.max_gap_fraction = max_gap_fraction
+        self.max_sequence_gap_fraction = max_sequence_gap_fraction
+        self.divergence_mads = divergence_mads
+        self.codons = codons
+        self.drop_flagged = drop_flagged
+        self.conservation = conservation.Conservation()
+        self.distances = distances.Distances()
+
+    def _get_kept_columns(self, matrix):
+        """ Returns the mask of the columns of the given matrix that are kept """
+        gap_fraction = 1 - self.conservation.occupancy(matrix) / max(matrix.shape[0], 1)
+        if not self.codons:
+            return gap_fraction <= self.max_gap_fraction
+        num_codons = len(gap_fraction) // 3
+        codon_gap_fraction = gap_fraction[:num_codons * 3].reshape(-1, 3).mean(axis=1)
+        keep = np.zeros(len(gap_fraction), dtype=bool)
+        keep[:num_codons * 3] = np.repeat(codon_gap_fraction <= self.max_gap_fraction, 3)
+        return keep
+
+    def _flag_sequences(self, orgs, matrix):
+        """ Returns the list of Flags of every flagged organism of the given trimmed matrix """
+        flags = {}
+        if not matrix.shape[1]:
+            return flags
+        gap_fraction = (matrix == self.conservation.GAP).mean(axis=1)
+        for idx in np.flatnonzero(gap_fraction > self.max_sequence_gap_fraction):
+            flags.setdefault(orgs[idx], []).append(Flags.GAPPY)
+        if len(orgs) > 2:
+            p_distance = self.distances.compute(orgs, matrix).p_distance.astype(np.float64)
+            np.fill_diagonal(p_distance, np.nan)
+            divergence = np.nanmean(p_distance, axis=1)
+            median = np.nanmedian(divergence)
+            mad = np.nanmedian(np.abs(divergence - median))
+            if mad > 0:
+                for idx in np.flatnonzero(divergence > median + self.divergence_mads * mad):
+                    flags.setdefault(orgs[idx], []).append(Flags.DIVERGENT)
+        return flags
+
+    def trim(self, orgs, matrix):
+        """
+        Trims an MSA and flags its outlier sequences
+        :param list orgs: organisms of the rows of the matrix
+        :param matrix: uint8 (organisms x columns) matrix
+        :return: TrimmedAlignment
+        """
+        columns = np.flatnonzero(self._get_kept_columns(matrix)).astype(np.int32)
+        trimmed = np.asarray(matrix)[:, columns]
+        flags = self._flag_sequences(orgs, trimmed)
+        if self.drop_flagged and flags:
+            rows = [idx for idx, org in enumerate(orgs) if org not in flags]
+            orgs, trimmed = [orgs[idx] for idx in rows], trimmed[rows]
+        return TrimmedAlignment(list(orgs), trimmed, columns, matrix.shape[1], flags)
+
+    def trim_file(self, path, out_dir):
+        """
+        Trims a FASTA MSA and writes the trimmed MSA, under the same filename, and its column map, as .columns.npy,
+        to the given directory
+        :return: TrimmedAlignment
+        """
+        records = dict(fasta.Reader(path))
+        trimmed = self.trim(list(records.keys()), self.conservation.to_matrix(list(records.values())))
+        filename = os.path.basename(path)
+        with fasta.Writer(os.path.join(out_dir, filename)) as writer:
+            for org, seq in trimmed.sequences().items():
+                writer.write(org, seq)
+        np.save(os.path.join(out_dir, os.path.splitext(filename)[0] + ".columns.npy"), trimmed.columns)
+        return trimmed
+
+    def trim_files(self, dir_path=None, out_dir=None):
+        """
+        Trims every MSA of a directory and writes a qc_report.json summary next to the trimmed MSAs
+        :param str dir_path: directory of the FASTA MSAs, defaults to src/data/alignments
+        :param str out_dir: directory of the trimmed MSAs, defaults to src/data/alignments_trimmed
+        :return: dictionary of TrimmedAlignment keyed on MSA filename
+        """
+        dir_path = dir_path if dir_path else os.path.join(os.getcwd(), "src", "data", "alignments")
+        out_dir = out_dir if out_dir else os.path.join(os.getcwd(), "src", "data", "alignments_trimmed")
+        os.makedirs(out_dir, exist_ok=True)
+        final, report = {}, {}
+        for filename in sorted(os.listdir(dir_path)):
+            trimmed = self.trim_file(os.path.join(dir_path, filename), out_dir)
+            final[filename] = trimmed
+            report[filename] = {
+                "columns": trimmed.num_columns,
+                "kept_columns": len(trimmed.columns),
+                "flagged": trimmed.flags,
+            }
+        with open(os.path.join(out_dir, "qc_report.json"), "w") as f:
+            json.dump(report, f, indent=2)
+        return final
+
+
+if __name__ == "__main__":
+    trimmer = Trimmer()
+    trimmer.trim_files()
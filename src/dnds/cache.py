@@ -0,0 +1,115 @@
+import hashlib
+import os
+import sqlite3
+import time
+
+from src.dnds import constants
+
+
+class Cache:
+    """ Responsible for persisting dnds scores on disk, keyed on the content of the cleaned pair of sequences, the
+    engine that scored them, and the version of the dnds scoring code that rounded them, so that a pair is only ever
+    scored once across runs, genes and organisms """
+
+    # maximum number of scores kept on disk, the least recently used scores are evicted past this
+    MAX_ENTRIES = 500000
+    # number of insertions between two checks of the cache size
+    EVICTION_INTERVAL = 1000
+    # number of pending hits past which their last used times are written without waiting for the next flush
+    TOUCH_INTERVAL = 1000
+
+    def __init__(self, path=None, max_entries=MAX_ENTRIES):
+        """
+        Constructor
+        :param str path: path to the SQLite file holding the scores, defaults to src/data/dnds/scores_cache.sqlite
+        :param int max_entries: maximum number of scores kept on disk
+        """
+        self.path = path if path else self._get_default_path()
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.insertions = 0
+        # last used times of the hits, written in a single transaction by flush rather than once per hit
+        self.touched = {}
+        self.connection = self._connect()
+
+    def _get_default_path(self):
+        """ Builds and returns the default path of the cache file """
+        return os.path.join(os.getcwd(), "src", "data", "dnds", "scores_cache.sqlite")
+
+    def _connect(self):
+        """ Opens the cache file and creates the scores table if needed """
+        # the timeout lets the worker processes of dnds/scheduler wait on each other's writes
+        connection = sqlite3.connect(self.path, timeout=60)
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute("CREATE TABLE IF NOT EXISTS scores (key TEXT PRIMARY KEY, score REAL, used REAL)")
+        connection.execute("CREATE INDEX IF NOT EXISTS scores_used ON scores (used)")
+        connection.commit()
+        return connection
+
+    def key(self, version, seq1, seq2):
+        """
+        Builds the key of a pair of cleaned sequences. The key does not depend on the order of the pair as dnds is
+        symmetric
+        :param str version: name and version of the engine that scores the pair
+        :param str seq1: first cleaned sequence
+        :param str seq2: second cleaned sequence
+        :return: hex digest key
+        """
+        first, second = sorted([seq1, seq2])
+        digest = hashlib.sha256()
+        # scores are stored rounded and with NaNs made neutral, so the code doing that is part of the key too
+        for part in [constants.ENGINE_VERSION, version, first, second]:
+            digest.update(part.encode("ascii"))
+            digest.update(b"\0")
+        return digest.hexdigest()
+
+    def get(self, key):
+        """ Returns the score stored at the given key, None if the key is not cached """
+        row = self.connection.execute("SELECT score FROM scores WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self.touched[key] = time.time()
+        if len(self.touched) >= self.TOUCH_INTERVAL:
+            self.flush()
+        return row[0]
+
+    def put(self, key, score):
+        """ Stores the given score at the given key, along with the last used times of the pending hits """
+        self._write_touched()
+        self.connection.execute("INSERT OR REPLACE INTO scores (key, score, used) VALUES (?, ?, ?)",
+                                (key, score, time.time()))
+        self.connection.commit()
+        self.insertions += 1
+        if self.insertions % self.EVICTION_INTERVAL == 0:
+            self.evict()
+
+    def _write_touched(self):
+        """ Writes the last used times of the pending hits in the current transaction, without committing """
+        if self.touched:
+            self.connection.executemany("UPDATE scores SET used = ? WHERE key = ?",
+                                        [(used, key) for key, used in self.touched.items()])
+            self.touched = {}
+
+    def flush(self):
+        """ Writes the last used times of the pending hits in a single transaction """
+        if self.touched:
+            self._write_touched()
+            self.connection.commit()
+
+    def evict(self):
+        """ Removes the least recently used scores until the cache holds at most max_entries scores """
+        self.flush()  # recently hit scores must not be evicted on stale last used times
+        count = self.connection.execute("SELECT COUNT(*) FROM scores").fetchone()[0]
+        if count <= self.max_entries:
+            return
+        self.connection.execute("DELETE FROM scores WHERE key IN (SELECT key FROM scores ORDER BY used LIMIT ?)",
+                                (count - self.max_entries,))
+        self.connection.commit()
+
+    def close(self):
+        """ Enforces the size bound and closes the cache file """
+        self.evict()
+        self.connection.close()
@@ -0,0 +1,72 @@
+import numpy as np
+
+
+class Cleaner:
+    """ Responsible for cleaning aligned sequences such that dnds can be computed. The alignment is cut in codon
+    columns, i.e. triplets of alignment positions, and every codon column holding a gap or anything other than an
+    unambiguous nucleotide in either sequence is dropped whole, so a gap inside a codon never shifts the codons that
+    come after it """
+
+    GAP = "-"
+    ACCEPTED_CHARS = "ACGT"
+    CODON_LEN = 3
+
+    def __init__(self):
+        """ Constructor """
+        self.accepted = self._build_accepted_lookup()
+
+    def _build_accepted_lookup(self):
+        """ Builds a table that tells, for every byte, whether it is an accepted nucleotide """
+        accepted = np.zeros(256, dtype=bool)
+        accepted[np.frombuffer(self.ACCEPTED_CHARS.encode("ascii"), dtype=np.uint8)] = True
+        return accepted
+
+    def _view(self, seq):
+        """ Returns a uint8 view of the given str, bytes, or uint8 array sequence """
+        if isinstance(seq, np.ndarray):
+            return seq
+        if isinstance(seq, str):
+            seq = seq.encode("ascii")
+        return np.frombuffer(seq, dtype=np.uint8)
+
+    def clean(self, seq1, seq2):
+        """
+        Cleans the given pair of sequences
+        :param str seq1: first aligned sequence
+        :param str seq2: second aligned sequence
+        :return: tuple of the cleaned sequences, which have the same length, a multiple of 3
+        """
+        return self.clean_many(seq1, [seq2])[0]
+
+    def clean_with_positions(self, seq1, seq2):
+        """
+        Cleans the given pair of sequences, see clean
+        :param str seq1: first aligned sequence
+        :param str seq2: second aligned sequence
+        :return: tuple of the cleaned sequences and the alignment codon index of every codon they kept
+        """
+        return self.clean_many(seq1, [seq2], positions=True)[0]
+
+    def clean_many(self, reference, sequences, positions=False):
+        """
+        Cleans the given reference against each of the given sequences in one pass
+        :param str reference: aligned sequence every other sequence is paired with
+        :param list sequences: aligned sequences, all of the same length as the reference
+        :param bool positions: whether to also return the alignment codon index of every kept codon
+        :return: list of (cleaned reference, cleaned sequence) tuples, one per sequence, with the array of the kept
+        alignment codon indices appended when positions is set
+        """
+        ref = self._view(reference)
+        matrix = np.vstack([self._view(seq) for seq in sequences])
+        assert (matrix.shape[1] == len(ref))
+        # an incomplete trailing codon column cannot be scored
+        trim_len = len(ref) - len(ref) % self.CODON_LEN
+        ref_codons = ref[:trim_len].reshape(-1, self.CODON_LEN)
+        ref_legal = self.accepted[ref_codons].all(axis=1)
+        codons = matrix[:, :trim_len].reshape(len(sequences), -1, self.CODON_LEN)
+        legal = self.accepted[codons].all(axis=2) & ref_legal  # gaps are not accepted, so they drop their codon
+        final = []
+        for row_codons, row_legal in zip(codons, legal):
+            cleaned = (ref_codons[row_legal].tobytes().decode("ascii"), row_codons[row_legal].tobytes().decode("ascii"))
+            final.append(cleaned + (np.flatnonzero(row_legal),) if positions else cleaned)
+        return final
@@ -0,0 +1,207 @@
+import hashlib
+import itertools
+import os
+
+import numpy as np
+
+BASES = "ACGT"
+CODON_LEN = 3
+NUM_CODONS = 64
+STOP = "*"
+INVALID = -1  # codon index of any codon holding a byte that is not an unambiguous nucleotide
+DEGENERACY_CLASSES = (0, 2, 4)  # nondegenerate, twofold, and fourfold degenerate sites of Li (1993)
+
+
+class GeneticCodes:
+    """ A namespace of genetic codes, as the amino acids of the 64 codons enumerated in the order of BASES (AAA, AAC,
+    AAG, AAT, ACA, ...) """
+    STANDARD = "KNKNTTTTRSRSIIMIQHQHPPPPRRRRLLLLEDEDAAAAGGGGVVVV*Y*YSSSS*CWCLFLF"
+    # AGA and AGG are stops, ATA codes for methionine, and TGA for tryptophan
+    VERTEBRATE_MITOCHONDRIAL = "KNKNTTTT*S*SMIMIQHQHPPPPRRRRLLLLEDEDAAAAGGGGVVVV*Y*YSSSSWCWCLFLF"
+
+
+class CodonTables:
+    """ Responsible for holding the precomputed codon substitution tables of a genetic code: the 64x64 synonymous and
+    non-synonymous differences of every pair of codons, averaged over the mutational pathways that do not go through
+    a stop codon, the number of synonymous sites of every codon, and the degeneracy class of every codon position """
+
+    # tables are only built once per process and genetic code, see get
+    _tables = {}
+    # bump whenever the way the tables are built changes, cached tables of other versions are never read
+    BUILDER_VERSION = 1
+
+    def __init__(self, code=GeneticCodes.STANDARD, cache_dir=None):
+        """
+        Constructor
+        :param str code: genetic code, one of GeneticCodes or any string of 64 amino acids in the same layout
+        :param str cache_dir: directory of the cached tables files, tables are built from scratch when not given
+        """
+        self.code = code
+        self.lookup = self._build_lookup()
+        self.stops = np.array([aa == STOP for aa in code])
+        self.bases = np.array([self._codon(idx) for idx in range(NUM_CODONS)], dtype=np.int8)
+        self.degeneracy = self._build_degeneracy()
+        cache_path = os.path.join(cache_dir, self._get_cache_filename()) if cache_dir else None
+        if cache_path and os.path.exists(cache_path):
+            with np.load(cache_path) as cached:
+                self.syn_sites, self.syn_diffs, self.non_syn_diffs = \
+                    cached["syn_sites"], cached["syn_diffs"], cached["non_syn_diffs"]
+        else:
+            self.syn_sites = self._build_syn_sites()
+            self.syn_diffs, self.non_syn_diffs = self._build_diffs()
+            if cache_path:
+                np.savez(cache_path, syn_sites=self.syn_sites, syn_diffs=self.syn_diffs,
+                         non_syn_diffs=self.non_syn_diffs)
+
+    @classmethod
+    def get(cls, code=GeneticCodes.STANDARD):
+        """ Returns the tables of the given genetic code, built or read from src/data/dnds/codons once per process """
+        if code not in cls._tables:
+            cache_dir = os.path.join(os.getcwd(), "src", "data", "dnds", "codons")
+            os.makedirs(cache_dir, exist_ok=True)
+            cls._tables[code] = cls(code=code, cache_dir=cache_dir)
+        return cls._tables[code]
+
+    def _get_cache_filename(self):
+        """ Returns the name of the cached tables file of the genetic code and builder version """
+        return "{}_v{}.npz".format(hashlib.sha1(self.code.encode("ascii")).hexdigest()[:12], self.BUILDER_VERSION)
+
+    def _build_lookup(self):
+        """ Builds a table that maps every byte to its 2-bit nucleotide code, or INVALID """
+        lookup = np.full(256, INVALID, dtype=np.int16)
+        for code, base in enumerate(BASES):
+            lookup[ord(base)] = code
+            lookup[ord(base.lower())] = code
+        return lookup
+
+    def _codon(self, idx):
+        """ Returns the list of nucleotide codes of the codon with the given index """
+        return [idx // 16, (idx // 4) % 4, idx % 4]
+
+    def _index(self, codon):
+        """ Returns the index of the given list of nucleotide codes """
+        return codon[0] * 16 + codon[1] * 4 + codon[2]
+
+    def _build_syn_sites(self):
+        """ Builds the number of synonymous sites of each of the 64 codons. Stop codons have no sites """
+        sites = np.zeros(NUM_CODONS)
+        for idx in range(NUM_CODONS):
+            if self.stops[idx]:
+                continue
+            codon = self._codon(idx)
+            for pos in range(CODON_LEN):
+                for base in range(len(BASES)):
+                    if base == codon[pos]:
+                        continue
+                    mutant = list(codon)
+                    mutant[pos] = base
+                    if self.code[self._index(mutant)] == self.code[idx]:
+                        sites[idx] += 1 / 3
+        return sites
+
+    def _build_degeneracy(self):
+        """ Builds the (64 x 3) degeneracy class of every codon position: 0 when none of its 3 changes is synonymous, 4
+        when all of them are, and 2 otherwise, which includes the 3-fold third position of Ile as in Li (1993). Changes
+        to a stop codon are non-synonymous """
+        degeneracy = np.zeros((NUM_CODONS, CODON_LEN), dtype=np.int8)
+        for idx in range(NUM_CODONS):
+            if self.stops[idx]:
+                continue
+            codon = self._codon(idx)
+            for pos in range(CODON_LEN):
+                synonymous = 0
+                for base in range(len(BASES)):
+                    if base == codon[pos]:
+                        continue
+                    mutant = list(codon)
+                    mutant[pos] = base
+                    synonymous += self.code[self._index(mutant)] == self.code[idx]
+                degeneracy[idx, pos] = 4 if synonymous == 3 else 2 if synonymous else 0
+        return degeneracy
+
+    def _build_diffs(self):
+        """ Builds the 64x64 tables of synonymous and non-synonymous differences between codons. Pairs that cannot be
+        scored hold NaN """
+        syn = np.full((NUM_CODONS, NUM_CODONS), np.nan)
+        non_syn = np.full((NUM_CODONS, NUM_CODONS), np.nan)
+        for idx1 in range(NUM_CODONS):
+            for idx2 in range(NUM_CODONS):
+                if self.stops[idx1] or self.stops[idx2]:
+                    continue
+                c1, c2 = self._codon(idx1), self._codon(idx2)
+                positions = [p for p in range(CODON_LEN) if c1[p] != c2[p]]
+                syn_total, non_syn_total, paths = 0, 0, 0
+                for order in itertools.permutations(positions):
+                    curr = list(c1)
+                    path_syn, path_non_syn, valid = 0, 0, True
+                    for pos in order:
+                        nxt = list(curr)
+                        nxt[pos] = c2[pos]
+                        if self.stops[self._index(nxt)]:
+                            valid = False
+                            break
+                        if self.code[self._index(curr)] == self.code[self._index(nxt)]:
+                            path_syn += 1
+                        else:
+                            path_non_syn += 1
+                        curr = nxt
+                    if valid:
+                        syn_total += path_syn
+                        non_syn_total += path_non_syn
+                        paths += 1
+                if paths:
+                    syn[idx1, idx2] = syn_total / paths
+                    non_syn[idx1, idx2] = non_syn_total / paths
+        return syn, non_syn
+
+    def encode(self, seq):
+        """
+        Encodes a sequence as an array of codon indices, a trailing partial codon is dropped
+        :param seq: sequence, as str, bytes, or uint8 array
+        :return: array of codon indices, where codons holding invalid bytes are INVALID
+        """
+        if isinstance(seq, str):
+            seq = seq.encode("ascii")
+        codes = self.lookup[np.frombuffer(seq, dtype=np.uint8)]
+        codes = codes[:len(codes) - len(codes) % CODON_LEN].reshape(-1, CODON_LEN)
+        idx = codes[:, 0] * 16 + codes[:, 1] * 4 + codes[:, 2]
+        idx[(codes == INVALID).any(axis=1)] = INVALID
+        return idx
+
+    def scorable(self, idx1, idx2):
+        """ Returns the mask of the pairs of codon indices that can be scored, i.e. that are valid and not stops """
+        valid = (idx1 != INVALID) & (idx2 != INVALID)
+        valid[valid] = ~np.isnan(self.syn_diffs[idx1[valid], idx2[valid]])
+        return valid
+
+    def sites(self, idx):
+        """ Gathers the synonymous and non-synonymous sites of an array of codon indices """
+        syn_sites = self.syn_sites[idx]
+        return syn_sites, CODON_LEN - syn_sites
+
+    def differences(self, idx1, idx2):
+        """ Gathers the synonymous and non-synonymous differences of two arrays of codon indices """
+        return self.syn_diffs[idx1, idx2], self.non_syn_diffs[idx1, idx2]
+
+    def degenerate_sites(self, idx):
+        """ Counts the nondegenerate, twofold, and fourfold sites of an array of codon indices, as a (codons x 3)
+        array """
+        degeneracy = self.degeneracy[idx]
+        return np.stack([(degeneracy == cls).sum(axis=1) for cls in DEGENERACY_CLASSES], axis=1)
+
+    def degenerate_substitutions(self, idx1, idx2):
+        """
+        Counts the transitions and transversions between two arrays of codon indices at every degeneracy class, site by
+        site. A site whose class differs between the two codons counts half in each class, the same way its sites are
+        averaged over the two sequences
+        :return: tuple of (codons x 3) transitions and transversions, in the order of DEGENERACY_CLASSES
+        """
+        bases1, bases2 = self.bases[idx1], self.bases[idx2]
+        differ = bases1 != bases2
+        # purines (A, G) and pyrimidines (C, T) have codes of the same parity in the order of BASES
+        transitions = differ & ((bases1 - bases2) % 2 == 0)
+        transversions = differ & ~transitions
+        degeneracy1, degeneracy2 = self.degeneracy[idx1], self.degeneracy[idx2]
+        weights = [((degeneracy1 == cls).astype(np.float64) + (degeneracy2 == cls)) / 2 for cls in DEGENERACY_CLASSES]
+        return (np.stack([(transitions * weight).sum(axis=1) for weight in weights], axis=1),
+                np.stack([(transversions * weight).sum(axis=1) for weight in weights], axis=1))
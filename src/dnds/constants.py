@@ -0,0 +1,14 @@
+# a file that holds constants relevant to the dnds domain
+
+# version of the dnds scoring code (cleaning, backends, and how their results are rounded), bump whenever a change
+# alters the scores, so that a run never resumes from the journal of a run scored by older code
+ENGINE_VERSION = "2"
+
+
+class Backends:
+    """ A namespace of the engines that can compute dN/dS scores """
+    R = "R"  # ape's dnds, called through rpy2 once per pair of organisms
+    R_BATCHED = "R-batched"  # ape's dnds, called through rpy2 once per gene with all the pairs of organisms
+    R_SERVER = "R-server"  # ape's dnds, called once per gene by the warm R workers of a running dnds/rserver
+    NUMPY = "numpy"  # the native Li (1993) engine in src/dnds/engine, the method of ape's dnds
+    NUMPY_NG86 = "numpy-ng86"  # the native Nei-Gojobori engine in src/dnds/engine
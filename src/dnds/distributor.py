@@ -6,7 +6,7 @@ import pandas as pd
 import seaborn as sns
 
 from src import exceptions
-from src.dnds import organisms_classes
+from src.dnds import organisms_classes, tensor
 
 
 class Distributor:
@@ -21,10 +21,20 @@ class Distributor:
     def __init__(self):
         """ Constructor """
         self.sig_orgs = self._get_significant_orgs()
+        self.scores = self._load_scores()
         self.dnds_data = self._get_hg_data()
         self.habitat_bins = self._get_binned_habitat_dataframe(class_type=organisms_classes.OrganismHabitatGroups())
         self.bone_bins = self._get_binned_habitat_dataframe(class_type=organisms_classes.OrganismBoneGroups())
 
+    def _load_scores(self):
+        """ Memory-maps the dnds scores tensor. The tensor is converted from the per-organism CSVs, which
+        dnds/visualizer exports along with it, when it was never built or was built for other organisms """
+        orgs = list(self.sig_orgs.keys())
+        path = tensor.ScoreTensor.get_default_path()
+        if not os.path.exists(path) or set(tensor.ScoreTensor.load(path).orgs) != set(orgs):
+            tensor.ScoreTensor.from_csv_dir(orgs).save(path)
+        return tensor.ScoreTensor.load(path)
+
     def _get_significant_orgs(self):
         """ Reads in the significant organisms selected for this study """
         orgs = {}
@@ -41,12 +51,7 @@ class Distributor:
         """ Creates a dictionary of the data to be plotted """
         final = {}
         for sig_org in self.sig_orgs.keys():
-            sig_org_csv = os.path.join(os.getcwd(), "src", "data", "dnds", "{}.csv".format(sig_org))
-            df = pd.read_csv(sig_org_csv)
-            histo_vals = []
-            for x in df.values:
-                histo_vals = histo_vals + list(x[1:])
-            final[sig_org] = sorted(histo_vals)
+            final[sig_org] = sorted(self.scores.values(sig_org).ravel())
         return final
 
     def visualize(self):
@@ -106,12 +111,7 @@ class Distributor:
         binned = {}
         for org_class, orgs in class_type.class_org_map.items():
             binned[org_class] = {}
-            main_df = pd.DataFrame()
-            for org in orgs:
-                org_csv = os.path.join(os.getcwd(), "src", "data", "dnds", "{}.csv".format(org))
-                df = pd.read_csv(org_csv)
-                main_df = pd.concat([main_df, df])
-            binned[org_class] = main_df
+            binned[org_class] = pd.concat([self.scores.frame(org) for org in orgs])
         return binned
 
     def _visualize_by_habitat(self):
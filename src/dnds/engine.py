@@ -0,0 +1,121 @@
+import numpy as np
+
+from src.dnds import codons
+
+
+class NeiGojobori:
+    """ Responsible for computing dN/dS ratios of aligned coding sequences with the Nei-Gojobori (1986) method and a
+    Jukes-Cantor correction. Works on byte arrays so that no R round-trip is necessary """
+
+    VERSION = "ng86-1"  # bump whenever the scoring logic changes, used for keying persisted scores
+
+    def __init__(self, code=codons.GeneticCodes.STANDARD):
+        """
+        Constructor
+        :param str code: genetic code of the sequences, one of dnds/codons.GeneticCodes
+        """
+        self.tables = codons.CodonTables.get(code)
+
+    def codon_counts(self, seq1, seq2):
+        """
+        Computes the synonymous and non-synonymous site and difference counts of every codon of a pair of aligned
+        sequences. Codons with invalid bytes or stops in either sequence are skipped
+        :param seq1: first sequence, as str or bytes
+        :param seq2: second sequence, as str or bytes
+        :return: tuple of arrays (synonymous sites, non-synonymous sites, synonymous diffs, non-synonymous diffs)
+        """
+        assert (len(seq1) == len(seq2))
+        idx1, idx2 = self.tables.encode(seq1), self.tables.encode(seq2)
+        scorable = self.tables.scorable(idx1, idx2)
+        idx1, idx2 = idx1[scorable], idx2[scorable]
+        syn_sites1, non_syn_sites1 = self.tables.sites(idx1)
+        syn_sites2, non_syn_sites2 = self.tables.sites(idx2)
+        syn_diffs, non_syn_diffs = self.tables.differences(idx1, idx2)
+        return (syn_sites1 + syn_sites2) / 2, (non_syn_sites1 + non_syn_sites2) / 2, syn_diffs, non_syn_diffs
+
+    def counts(self, seq1, seq2):
+        """
+        Computes the synonymous and non-synonymous site and difference counts of a pair of aligned sequences
+        :param seq1: first sequence, as str or bytes
+        :param seq2: second sequence, as str or bytes
+        :return: tuple of (synonymous sites, non-synonymous sites, synonymous diffs, non-synonymous diffs)
+        """
+        return tuple(counts.sum() for counts in self.codon_counts(seq1, seq2))
+
+    def jukes_cantor(self, p):
+        """ Applies the Jukes-Cantor correction to a proportion, or an array of proportions, of differences. Saturated
+        proportions give NaN """
+        arg = 1 - 4 * np.asarray(p, dtype=np.float64) / 3
+        with np.errstate(divide="ignore", invalid="ignore"):
+            return np.where(arg > 0, -3 / 4 * np.log(np.where(arg > 0, arg, 1)), np.nan)
+
+    def dnds(self, seq1, seq2):
+        """
+        Computes the dN/dS ratio of a pair of aligned sequences
+        :param seq1: first sequence, as str or bytes
+        :param seq2: second sequence, as str or bytes
+        :return: the dN/dS ratio, which can be NaN or inf for saturated or identical synonymous sites
+        """
+        syn_sites, non_syn_sites, syn_diffs, non_syn_diffs = self.counts(seq1, seq2)
+        if not syn_sites or not non_syn_sites:
+            return np.nan
+        ds = self.jukes_cantor(syn_diffs / syn_sites)
+        dn = self.jukes_cantor(non_syn_diffs / non_syn_sites)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            return float(dn / ds)
+
+
+class Li93:
+    """ Responsible for computing dN/dS ratios of aligned coding sequences with the Li (1993) method, the one of ape's
+    dnds. Sites are split into nondegenerate, twofold, and fourfold degenerate sites, and the transitions and
+    transversions at each class are corrected with Kimura's two-parameter model """
+
+    VERSION = "li93-1"  # bump whenever the scoring logic changes, used for keying persisted scores
+
+    def __init__(self, code=codons.GeneticCodes.STANDARD):
+        """
+        Constructor
+        :param str code: genetic code of the sequences, one of dnds/codons.GeneticCodes
+        """
+        self.tables = codons.CodonTables.get(code)
+
+    def counts(self, seq1, seq2):
+        """
+        Computes the site, transition, and transversion counts at every degeneracy class of a pair of aligned
+        sequences. Codons with invalid bytes or stops in either sequence are skipped
+        :param seq1: first sequence, as str or bytes
+        :param seq2: second sequence, as str or bytes
+        :return: tuple of arrays (sites, transitions, transversions), in the order of codons.DEGENERACY_CLASSES
+        """
+        assert (len(seq1) == len(seq2))
+        idx1, idx2 = self.tables.encode(seq1), self.tables.encode(seq2)
+        scorable = self.tables.scorable(idx1, idx2)
+        idx1, idx2 = idx1[scorable], idx2[scorable]
+        sites = (self.tables.degenerate_sites(idx1) + self.tables.degenerate_sites(idx2)).sum(axis=0) / 2
+        transitions, transversions = self.tables.degenerate_substitutions(idx1, idx2)
+        return sites, transitions.sum(axis=0), transversions.sum(axis=0)
+
+    def kimura(self, p, q):
+        """
+        Applies Kimura's two-parameter correction to proportions of transitions and transversions
+        :return: tuple of the transitional (A) and transversional (B) distances, which are NaN where saturated
+        """
+        a, b = 1 - 2 * p - q, 1 - 2 * q
+        with np.errstate(divide="ignore", invalid="ignore"):
+            log_a = np.where(a > 0, np.log(np.where(a > 0, a, 1)), np.nan)
+            log_b = np.where(b > 0, np.log(np.where(b > 0, b, 1)), np.nan)
+        return -log_a / 2 + log_b / 4, -log_b / 2
+
+    def dnds(self, seq1, seq2):
+        """
+        Computes the dN/dS ratio of a pair of aligned sequences
+        :param seq1: first sequence, as str or bytes
+        :param seq2: second sequence, as str or bytes
+        :return: the dN/dS ratio, which can be NaN or inf for saturated or identical synonymous sites
+        """
+        sites, transitions, transversions = self.counts(seq1, seq2)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            (l0, l2, l4), (a0, a2, a4), (b0, b2, b4) = sites, *self.kimura(transitions / sites, transversions / sites)
+            ks = (l2 * a2 + l4 * a4) / (l2 + l4) + b4
+            ka = a0 + (l0 * b0 + l2 * b2) / (l0 + l2)
+            return float(ka / ks)
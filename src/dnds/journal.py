@@ -0,0 +1,123 @@
+import hashlib
+import os
+
+from src.dnds import constants, engine
+
+
+class Journal:
+    """ Responsible for checkpointing the dnds scores of (gene, org1, org2) pairs as they are computed, so that an
+    interrupted run can be resumed by replaying the journal and scoring only the missing pairs. The scores of a gene
+    are followed by an end marker, and only the genes whose end marker made it to the disk are replayed """
+
+    HEADER_PREFIX = "# "
+    END_MARKER = "# end"
+    SEPARATOR = "\t"
+
+    def __init__(self, path=None):
+        """
+        Constructor
+        :param str path: path to the journal file, defaults to src/data/dnds/scores_journal.txt
+        """
+        self.path = path if path else os.path.join(os.getcwd(), "src", "data", "dnds", "scores_journal.txt")
+        self.out = None
+
+    def fingerprint(self, backend, alignments, orgs):
+        """
+        Builds the fingerprint of a run, a journal is only replayed by a run with the same fingerprint. The fingerprint
+        covers the version of the scoring code along with the inputs and parameters of the run
+        :param str backend: engine used to compute the dnds scores
+        :param dict alignments: aligned sequences keyed on gene and organism
+        :param list orgs: organisms to score
+        :return: hex digest fingerprint
+        """
+        digest = hashlib.sha256()
+        digest.update(backend.encode("utf-8"))
+        versions = [constants.ENGINE_VERSION, engine.NeiGojobori.VERSION, engine.Li93.VERSION]
+        digest.update("".join("\0{}".format(version) for version in versions).encode("utf-8"))
+        for gene, alignment in alignments.items():
+            for org in orgs:
+                digest.update("\0{}\0{}\0".format(gene, org).encode("utf-8"))
+                seq = alignment.get(org, "")
+                # str sequences and the uint8 rows of packed alignments hash to the same fingerprint
+                digest.update(seq.encode("ascii") if isinstance(seq, str) else seq)
+        return digest.hexdigest()
+
+    def replay(self, fingerprint):
+        """
+        Reads the scores journaled by a previous run with the same fingerprint, a journal of a different run is
+        discarded
+        :param str fingerprint: fingerprint of the current run
+        :return: dictionary of scores keyed on (gene, org1, org2)
+        """
+        completed = {}
+        if os.path.exists(self.path):
+            with open(self.path, "r") as f:
+                if f.readline().strip() == "{}{}".format(self.HEADER_PREFIX, fingerprint):
+                    completed = self._read_genes(f)
+        self._open(fingerprint, completed)
+        return completed
+
+    def _read_genes(self, f):
+        """ Reads the scores of the genes that were journaled up to their end marker, see replay """
+        completed = {}
+        pending = {}  # scores of the genes whose end marker has not been read yet
+        for line in f:
+            if not line.endswith("\n"):
+                break  # the last line can be partially written when a run is killed
+            split = line[:-1].split(self.SEPARATOR)
+            if split[0] == self.END_MARKER and len(split) == 2:
+                completed.update(pending.pop(split[1], {}))
+                continue
+            if len(split) != 4:
+                break
+            gene, org1, org2, score = split
+            try:
+                pending.setdefault(gene, {})[(gene, org1, org2)] = float(score)
+            except ValueError:
+                break
+        return completed
+
+    def _open(self, fingerprint, completed):
+        """ Rewrites the journal with the given fingerprint and completed scores and keeps it open for appending """
+        self.out = open(self.path, "w")
+        self.out.write("{}{}\n".format(self.HEADER_PREFIX, fingerprint))
+        genes = {}
+        for (gene, org1, org2), score in completed.items():
+            genes.setdefault(gene, []).append((org1, org2, score))
+        for gene, results in genes.items():
+            self._write_gene(gene, results)
+        self._sync()
+
+    def _write_gene(self, gene, results):
+        """ Writes the scores of a gene followed by its end marker """
+        for org1, org2, score in results:
+            self.out.write(self.SEPARATOR.join([gene, org1, org2, repr(float(score))]) + "\n")
+        self.out.write(self.SEPARATOR.join([self.END_MARKER, gene]) + "\n")
+
+    def append(self, gene, results):
+        """
+        Journals the scores of a gene
+        :param str gene: name of the scored gene
+        :param list results: list of (org1, org2, score) tuples
+        """
+        self._write_gene(gene, results)
+        self._sync()
+
+    def _sync(self):
+        """ Makes sure the journaled scores hit the disk """
+        self.out.flush()
+        os.fsync(self.out.fileno())
+
+    def clear(self):
+        """ Removes the journal once a run completes, the complete scores are persisted elsewhere """
+        if self.out:
+            self.out.close()
+            self.out = None
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+    def close(self):
+        """ Closes the journal and keeps it around for a later run to resume from """
+        if self.out:
+            self.out.close()
+            self.out = None
@@ -0,0 +1,114 @@
+import itertools
+import os
+
+import numpy as np
+
+from src.dnds import cleaner, engine
+
+
+class Profiler:
+    """ Responsible for computing sliding-window dN/dS profiles along the alignments of pairs of organisms. The
+    synonymous and non-synonymous site and difference counts of every codon are computed once and turned into prefix
+    sums, so every window is answered with two lookups regardless of its size """
+
+    # per-codon sites are multiples of 1/6 and differences are averaged over at most 6 pathways, so every count is a
+    # whole number of 1/60ths, which the prefix sums hold as exact integers
+    SCALE = 60
+
+    def __init__(self, window=50, step=10):
+        """
+        Constructor
+        :param int window: number of alignment codons per window
+        :param int step: number of alignment codons between the starts of two consecutive windows
+        """
+        self.window = window
+        self.step = step
+        self.engine = engine.NeiGojobori()
+        self.cleaner = cleaner.Cleaner()
+
+    def prefix_sums(self, seq1, seq2):
+        """
+        Builds the prefix sums of the codon counts of a pair of aligned sequences
+        :param str seq1: first aligned sequence
+        :param str seq2: second aligned sequence
+        :return: tuple of the alignment codon index of every scored codon, and the (4 x scored codons + 1) int64 array
+        of the cumulative synonymous sites, non-synonymous sites, synonymous diffs, and non-synonymous diffs in units of
+        1 / SCALE, where column i holds the sums of the first i scored codons
+        """
+        seq1_clean, seq2_clean, positions = self.cleaner.clean_with_positions(seq1, seq2)
+        # the engine skips the codons it cannot score, e.g. stops, so their positions are skipped along with them
+        tables = self.engine.tables
+        positions = positions[tables.scorable(tables.encode(seq1_clean), tables.encode(seq2_clean))]
+        # float sums drift off exact proportions, e.g. a saturated window ends up just below 3/4 and gets a finite
+        # Jukes-Cantor distance instead of NaN
+        counts = np.rint(np.vstack(self.engine.codon_counts(seq1_clean, seq2_clean)) * self.SCALE).astype(np.int64)
+        prefix = np.zeros((counts.shape[0], counts.shape[1] + 1), dtype=np.int64)
+        np.cumsum(counts, axis=1, out=prefix[:, 1:])
+        return positions, prefix
+
+    def profile(self, seq1, seq2, window=None, step=None):
+        """
+        Computes the dN/dS profile of a pair of aligned sequences
+        :param str seq1: first aligned sequence
+        :param str seq2: second aligned sequence
+        :param int window: number of alignment codons per window, defaults to the profiler window
+        :param int step: number of alignment codons between two windows, defaults to the profiler step
+        :return: tuple of the window starts and ends, as alignment codon indices (end excluded), and the window dN/dS
+        ratios, which are NaN or inf where the window is saturated, empty, or has no synonymous differences
+        """
+        positions, prefix = self.prefix_sums(seq1, seq2)
+        return self.windows(positions, prefix, len(seq1) // cleaner.Cleaner.CODON_LEN, window, step)
+
+    def windows(self, positions, prefix, num_codons, window=None, step=None):
+        """
+        Computes the dN/dS ratios of the windows of the given prefix sums, see profile. Windows are laid over the codons
+        of the alignment, so a window covers the same region of the gene in every pair of organisms, whatever codons
+        were dropped from the pair
+        :param positions: alignment codon index of every scored codon, see prefix_sums
+        :param prefix: prefix sums of the scored codons, see prefix_sums
+        :param int num_codons: number of codons of the alignment
+        """
+        window = window if window else self.window
+        step = step if step else self.step
+        starts = np.arange(0, max(num_codons - window + 1, 0), step)
+        ends = starts + window
+        # scored codons within [start, end) of every window
+        lo, hi = np.searchsorted(positions, starts), np.searchsorted(positions, ends)
+        # the exact integer sums of every window, the SCALE cancels out of the proportions
+        syn_sites, non_syn_sites, syn_diffs, non_syn_diffs = prefix[:, hi] - prefix[:, lo]
+        with np.errstate(divide="ignore", invalid="ignore"):
+            ds = self.engine.jukes_cantor(syn_diffs / syn_sites)
+            dn = self.engine.jukes_cantor(non_syn_diffs / non_syn_sites)
+            return starts, ends, dn / ds
+
+    def profile_alignments(self, alignments, orgs):
+        """
+        Computes the dN/dS profiles of every pair of the given organisms for all the genes in the given alignments
+        :param dict alignments: aligned sequences keyed on gene and organism
+        :param list orgs: organisms to profile
+        :return: dictionary of (starts, ends, ratios) profiles keyed on org1, org2, and gene, pairs where one of the
+        organisms does not have a gene are left out
+        """
+        final = {org1: {org2: {} for org2 in orgs if org2 != org1} for org1 in orgs}
+        for gene, alignment in alignments.items():
+            present = [org for org in orgs if len(alignment.get(org, ""))]
+            for org1, org2 in itertools.combinations(present, 2):
+                profile = self.profile(alignment.get(org1), alignment.get(org2))
+                final[org1][org2][gene] = profile
+                final[org2][org1][gene] = profile  # dnds is symmetric
+        return final
+
+    def save(self, profiles, path=None):
+        """ Saves the given profiles in a single .npz file, with one starts, ends, and ratios array per pair and
+        gene """
+        path = path if path else os.path.join(os.getcwd(), "src", "data", "dnds", "profiles.npz")
+        arrays = {}
+        for org1, others in profiles.items():
+            for org2, genes in others.items():
+                if org1 > org2:
+                    continue  # the mirrored pair holds the same profiles
+                for gene, (starts, ends, ratios) in genes.items():
+                    arrays["{}/{}/{}/starts".format(gene, org1, org2)] = starts
+                    arrays["{}/{}/{}/ends".format(gene, org1, org2)] = ends
+                    arrays["{}/{}/{}/ratios".format(gene, org1, org2)] = ratios
+        np.savez_compressed(path, **arrays)
@@ -0,0 +1,147 @@
+import multiprocessing
+import queue
+import threading
+from multiprocessing import connection
+
+from src.dnds import constants, scorer
+
+
+class Requests:
+    """ A namespace of the requests understood by the R server """
+    VERSION = "version"
+    DNDS = "dnds"
+
+
+def _serve_R(conn):
+    """
+    Runs in a worker process, sets up R a single time and scores the batches of pairs received on the given
+    connection until it is closed
+    :param conn: connection to the R server
+    """
+    # the batched backend keeps the setup and the R function definition in this warm process
+    r_scorer = scorer.Scorer(backend=constants.Backends.R_BATCHED, use_cache=False)
+    conn.send(r_scorer.version)
+    while True:
+        try:
+            seqs1, seqs2 = conn.recv()
+        except EOFError:
+            break
+        try:
+            conn.send([float(score) for score in r_scorer.get_dnds(seqs1, seqs2)])
+        except Exception as e:
+            print("CAUGHT EXCEPTION -- {}".format(e))
+            conn.send([float("nan")] * len(seqs1))  # NaN makes the pairs neutral
+
+
+class RServer:
+    """ Responsible for keeping a pool of warm R worker processes that score batches of sequence pairs for any number
+    of Python jobs, which connect through a local socket with dnds/rserver.RClient """
+
+    ADDRESS = ("localhost", 6011)
+    AUTHKEY = b"proteoglycan-dnds"
+    # number of times a batch is sent again to a fresh worker when its worker dies while scoring it
+    JOB_RETRIES = 1
+
+    def __init__(self, workers=1, address=ADDRESS):
+        """
+        Constructor
+        :param int workers: number of R worker processes
+        :param tuple address: (host, port) the server listens on
+        """
+        self.address = address
+        self.idle = queue.Queue()  # (process, connection) of the workers waiting for a batch
+        self.processes = []
+        self.version = None
+        for _ in range(workers):
+            self._start_worker()
+
+    def _start_worker(self):
+        """ Starts an R worker process, waits for its R setup to complete, and makes it available for batches """
+        parent_conn, child_conn = multiprocessing.Pipe()
+        process = multiprocessing.Process(target=_serve_R, args=(child_conn,), daemon=True)
+        process.start()
+        child_conn.close()  # only the worker holds this end, so its death shows up as EOFError
+        self.version = parent_conn.recv()
+        self.processes.append(process)
+        self.idle.put((process, parent_conn))
+
+    def _restart_worker(self, process, conn):
+        """ Replaces a dead worker with a fresh one, so that the pool keeps its capacity """
+        print("R worker {} died, restarting it".format(process.pid))
+        conn.close()
+        process.terminate()
+        process.join()
+        self.processes.remove(process)
+        self._start_worker()
+
+    def _score(self, batch):
+        """
+        Scores a batch of pairs on the first idle R worker, restarting workers that die on the way
+        :param tuple batch: (seqs1, seqs2) lists of sequences
+        :return: list of raw dnds scores, all NaN (neutral) when the batch kept killing its workers
+        """
+        for _ in range(self.JOB_RETRIES + 1):
+            process, conn = self.idle.get()
+            try:
+                conn.send(batch)
+                scores = conn.recv()
+            except (EOFError, OSError):
+                self._restart_worker(process, conn)
+                continue
+            self.idle.put((process, conn))
+            return scores
+        print("CAUGHT EXCEPTION -- R workers died while scoring a batch of {} pairs".format(len(batch[0])))
+        return [float("nan")] * len(batch[0])
+
+    def serve(self):
+        """ Accepts client connections until interrupted, each client is served by its own thread """
+        with connection.Listener(self.address, authkey=self.AUTHKEY) as listener:
+            print("R server listening on {}:{}".format(*self.address))
+            try:
+                while True:
+                    client = listener.accept()
+                    threading.Thread(target=self._serve_client, args=(client,), daemon=True).start()
+            finally:
+                for process in self.processes:
+                    process.terminate()
+
+    def _serve_client(self, client):
+        """ Answers the requests of a client, scoring batches on the first idle R worker """
+        with client:
+            while True:
+                try:
+                    request = client.recv()
+                except EOFError:
+                    break
+                if request[0] == Requests.VERSION:
+                    client.send(self.version)
+                elif request[0] == Requests.DNDS:
+                    client.send(self._score(request[1:]))
+
+
+class RClient:
+    """ Responsible for sending batches of sequence pairs to a running dnds/rserver.RServer """
+
+    def __init__(self, address=RServer.ADDRESS):
+        """
+        Constructor
+        :param tuple address: (host, port) of the R server
+        """
+        self.conn = connection.Client(address, authkey=RServer.AUTHKEY)
+
+    def get_version(self):
+        """ Returns the version of ape used by the server """
+        self.conn.send((Requests.VERSION,))
+        return self.conn.recv()
+
+    def get_dnds(self, seqs1, seqs2):
+        """ Returns the raw dnds scores of the pairs seqs1[i], seqs2[i] """
+        if not seqs1:
+            return []
+        self.conn.send((Requests.DNDS, list(seqs1), list(seqs2)))
+        return self.conn.recv()
+
+
+if __name__ == "__main__":
+    server = RServer(workers=multiprocessing.cpu_count())
+    server.serve()
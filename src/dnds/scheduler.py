@@ -0,0 +1,127 @@
+import itertools
+from concurrent import futures
+from multiprocessing import util
+
+from src.dnds import constants, journal, scorer, tensor
+
+# the scorer of the current worker process, set up once per process by _init_worker so that every worker only pays
+# for the backend setup (e.g. R bootstrapping) a single time
+_scorer = None
+
+
+def _init_worker(backend, use_cache):
+    """ Sets up the scorer of a worker process """
+    global _scorer
+    _scorer = scorer.Scorer(backend=backend, use_cache=use_cache)
+
+
+def _init_pool_worker(backend, use_cache):
+    """ Sets up the scorer of a pool worker process, whose cache is closed when the pool shuts the worker down """
+    _init_worker(backend, use_cache)
+    util.Finalize(None, _close_worker, exitpriority=10)
+
+
+def _close_worker():
+    """ Closes the cache of the scorer of the current process, which enforces the size bound of the cache """
+    if _scorer and _scorer.cache:
+        _scorer.cache.close()
+
+
+def _score_gene(gene, sequences, pairs):
+    """
+    Scores all the given pairs of organisms of a gene
+    :param str gene: name of the gene being scored
+    :param dict sequences: aligned sequences of the gene keyed on organism
+    :param list pairs: unordered (org1, org2) pairs to score
+    :return: tuple of the gene, a list of (org1, org2, score) tuples, and the (hits, misses) of the cache
+    """
+    cache = _scorer.cache
+    hits, misses = (cache.hits, cache.misses) if cache else (0, 0)
+    scores = _scorer.score_pairs(sequences, pairs)
+    results = [(org1, org2, score) for (org1, org2), score in zip(pairs, scores)]
+    if cache:
+        hits, misses = cache.hits - hits, cache.misses - misses
+    return gene, results, (hits, misses)
+
+
+class Scheduler:
+    """ Responsible for distributing the dnds scoring of organism pairs over a pool of processes. Every unordered pair
+    of organisms is scored once per gene, as dnds is symmetric, and work is chunked by gene """
+
+    def __init__(self, backend=constants.Backends.R, workers=1, use_cache=True, use_journal=True):
+        """
+        Constructor
+        :param str backend: engine used to compute the dnds scores, one of constants.Backends
+        :param int workers: number of worker processes, 1 scores in the current process, None uses all the CPUs
+        :param bool use_cache: whether the workers look up and persist scores in the on-disk dnds/cache
+        :param bool use_journal: whether to checkpoint scores in dnds/journal and resume interrupted runs from it
+        """
+        self.backend = backend
+        self.workers = workers
+        self.use_cache = use_cache
+        self.journal = journal.Journal() if use_journal else None
+        self.cache_hits = 0
+        self.cache_misses = 0
+
+    def schedule(self, alignments, orgs):
+        """
+        Computes the dnds scores of every pair of the given organisms for all the genes in the given alignments
+        :param dict alignments: aligned sequences keyed on gene and organism
+        :param list orgs: organisms to score
+        :return: tensor of scores, where the score of an organism against itself, and the score assumed when one of
+        the organisms does not have a gene, is 1 (neutral)
+        """
+        final = tensor.ScoreTensor(orgs, alignments.keys())
+        completed = {}
+        if self.journal:
+            completed = self.journal.replay(self.journal.fingerprint(self.backend, alignments, orgs))
+            for (gene, org1, org2), score in completed.items():
+                final.set_pair(org1, org2, gene, score)
+        try:
+            for gene, results, (hits, misses) in self._run(self._build_tasks(alignments, orgs, completed)):
+                self.cache_hits += hits
+                self.cache_misses += misses
+                for org1, org2, score in results:
+                    final.set_pair(org1, org2, gene, score)
+                if self.journal:
+                    self.journal.append(gene, results)
+        except BaseException:
+            if self.journal:
+                self.journal.close()  # keep the journal around so the next run resumes from it
+            raise
+        if self.journal:
+            self.journal.clear()
+        return final
+
+    def _build_tasks(self, alignments, orgs, completed):
+        """ Builds one task per gene, holding the sequences of the organisms that have the gene and their pairs that
+        have not been completed yet """
+        tasks = []
+        for gene, alignment in alignments.items():
+            sequences = {org: alignment.get(org) for org in orgs if len(alignment.get(org, ""))}
+            pairs = [(org1, org2) for org1, org2 in itertools.combinations(sequences.keys(), 2)
+                     if (gene, org1, org2) not in completed]
+            if pairs:
+                tasks.append((gene, sequences, pairs))
+        return tasks
+
+    def _run(self, tasks):
+        """ Runs the given tasks and yields their results as they complete """
+        if self.workers == 1:
+            _init_worker(self.backend, self.use_cache)
+            try:
+                for task in tasks:
+                    yield _score_gene(*task)
+            finally:
+                _close_worker()
+            return
+        pool = futures.ProcessPoolExecutor(max_workers=self.workers,
+                                           initializer=_init_pool_worker,
+                                           initargs=(self.backend, self.use_cache))
+        try:
+            submitted = [pool.submit(_score_gene, *task) for task in tasks]
+            for future in futures.as_completed(submitted):
+                yield future.result()
+        finally:
+            # on errors and Ctrl-C, do not wait for the genes that have not been started
+            pool.shutdown(cancel_futures=True)
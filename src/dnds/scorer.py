@@ -0,0 +1,157 @@
+import itertools
+
+import numpy as np
+
+from src import exceptions
+from src.dnds import cache, cleaner, constants, engine, rserver
+
+
+class Scorer:
+    """ Responsible for computing the dnds scores of pairs of aligned sequences with one of the dnds backends """
+
+    def __init__(self, backend=constants.Backends.R, use_cache=True):
+        """
+        Constructor
+        :param str backend: engine used to compute the dnds scores, one of constants.Backends
+        :param bool use_cache: whether to look up and persist scores in the on-disk dnds/cache
+        """
+        self.backend = backend
+        self.version = None  # name and version of the engine, set up along with the backend
+        self.get_dnds = self._setup_dnds_access()
+        self.cleaner = cleaner.Cleaner()
+        self.cache = cache.Cache() if use_cache else None
+
+    def _setup_dnds_access(self):
+        """ Sets up the engine of the selected backend and returns a function that takes two lists of sequences and
+        returns the raw dnds score of each pair """
+        if self.backend == constants.Backends.R:
+            return self._batch(self._setup_R_access())
+        if self.backend == constants.Backends.R_BATCHED:
+            return self._setup_R_batched_access()
+        if self.backend == constants.Backends.R_SERVER:
+            client = rserver.RClient()
+            self.version = client.get_version()
+            return client.get_dnds
+        if self.backend == constants.Backends.NUMPY:
+            self.version = engine.Li93.VERSION
+            return self._batch(engine.Li93().dnds)
+        if self.backend == constants.Backends.NUMPY_NG86:
+            self.version = engine.NeiGojobori.VERSION
+            return self._batch(engine.NeiGojobori().dnds)
+        raise exceptions.UnknownBackendException("unknown dnds backend: {}".format(self.backend))
+
+    def _batch(self, get_dnds):
+        """ Wraps a function that scores a single pair of sequences into one that scores lists of pairs """
+        def get_dnds_batch(seqs1, seqs2):
+            scores = []
+            for seq1, seq2 in zip(seqs1, seqs2):
+                try:
+                    scores.append(get_dnds(seq1, seq2))
+                except Exception as e:
+                    print("CAUGHT EXCEPTION -- {}".format(e))
+                    # exceptions can be thrown if two sequences are very divergent, NaN makes this neutral
+                    scores.append(np.nan)
+            return scores
+        return get_dnds_batch
+
+    def _setup_R(self):
+        """ Sets up the necessary R components such as libs, and returns the R objects interface """
+        # imported here so that the other backends can run on hosts without an R toolchain
+        from rpy2 import robjects
+        from rpy2.robjects import packages, vectors
+
+        # R package names
+        packnames = ['ape']
+        names_to_install = [x for x in packnames if not packages.isinstalled(x)]
+        # only touch CRAN when something is missing, so the setup works offline once ape is installed
+        if len(names_to_install) > 0:
+            utils = packages.importr('utils')
+            # select a mirror for R packages
+            utils.chooseCRANmirror(ind=1)  # select the first mirror in the list
+            utils.install_packages(vectors.StrVector(names_to_install))
+        self.version = "ape-{}".format(packages.importr('ape').__version__)
+        return robjects
+
+    def _setup_R_access(self):
+        """ Sets up the R function that scores a single pair of sequences """
+        robjects = self._setup_R()
+        robjects.r(
+            '''
+            # function to compute the DN/DS ratio of two sequences
+            library(ape)
+            get_dnds = function(seq1, seq2) {
+                mtx = c(strsplit(seq1, ""), strsplit(seq2, ""))
+                bin = as.DNAbin(mtx)
+                dnds(bin)
+            }
+            '''
+        )
+        get_dnds = robjects.r['get_dnds']
+        return lambda seq1, seq2: get_dnds(seq1, seq2)[0]  # results come back as vectors
+
+    def _setup_R_batched_access(self):
+        """ Sets up the R function that scores all the given pairs of sequences in a single call to R """
+        robjects = self._setup_R()
+        robjects.r(
+            '''
+            # function to compute the DN/DS ratios of the pairs seqs1[i], seqs2[i]
+            library(ape)
+            get_dnds_batch = function(seqs1, seqs2) {
+                sapply(seq_along(seqs1), function(i) {
+                    tryCatch({
+                        mtx = c(strsplit(seqs1[i], ""), strsplit(seqs2[i], ""))
+                        bin = as.DNAbin(mtx)
+                        dnds(bin)[1]
+                    }, error = function(e) NaN)  # very divergent sequences, NaN makes this neutral
+                })
+            }
+            '''
+        )
+        get_dnds_batch = robjects.r['get_dnds_batch']
+
+        def get_dnds(seqs1, seqs2):
+            if not seqs1:
+                return []
+            return list(get_dnds_batch(robjects.StrVector(seqs1), robjects.StrVector(seqs2)))
+        return get_dnds
+
+    def score_pairs(self, sequences, pairs):
+        """
+        Computes the dnds scores of the given pairs of organisms. All the pairs that are not cached are handed to the
+        backend at once, which lets the batched R backend score a whole gene with a single call
+        :param dict sequences: aligned sequences keyed on organism
+        :param list pairs: (org1, org2) pairs to score
+        :return: list of dnds scores, rounded to 2 decimals, or 1 (neutral) when they cannot be computed
+        """
+        # dnds < 1 = negative selection, dnds == 1 = neutral, dnds > 1 = positive selection
+        cleaned = self._clean_pairs(sequences, pairs)
+        scores = [None] * len(pairs)
+        keys = {}
+        for idx, (seq1_clean, seq2_clean) in enumerate(cleaned):
+            # apparently, it can happen that we get non-unique sequences after cleaning
+            if seq1_clean == seq2_clean:
+                scores[idx] = 1
+            elif self.cache:
+                keys[idx] = self.cache.key(self.version, seq1_clean, seq2_clean)
+                scores[idx] = self.cache.get(keys[idx])
+        pending = [idx for idx, score in enumerate(scores) if score is None]
+        computed = self.get_dnds([cleaned[idx][0] for idx in pending], [cleaned[idx][1] for idx in pending])
+        for idx, score in zip(pending, computed):
+            # placing a 1 for neutrality when we get NaNs, based on docs, the sequences should be
+            # highly divergent but don't know for sure, safer to place in neutral, might change
+            # mind though...
+            scores[idx] = 1 if np.isnan(score) or np.isinf(score) else round(score, 2)
+            if self.cache:
+                self.cache.put(keys[idx], scores[idx])
+        if self.cache:
+            self.cache.flush()  # the hits of a fully cached gene are touched once per gene
+        return scores
+
+    def _clean_pairs(self, sequences, pairs):
+        """ Cleans the given pairs of organisms, each organism is cleaned against all of its partners in one call """
+        cleaned = []
+        # pairs come grouped by their first organism when they are enumerated with itertools.combinations
+        for org1, org_pairs in itertools.groupby(pairs, key=lambda pair: pair[0]):
+            partners = [sequences[org2] for _, org2 in org_pairs]
+            cleaned.extend(self.cleaner.clean_many(sequences[org1], partners))
+        return cleaned
@@ -0,0 +1,126 @@
+import csv
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+
+class ScoreTensor:
+    """ Responsible for holding the dnds scores as a dense float32 (organisms x organisms x genes) tensor, which is
+    saved as a memory-mapped .npy file along with a small JSON index of the organism and gene axes """
+
+    ORGANISM = "organism"  # name of the organism column of the frames, as in the original per-organism CSVs
+    NEUTRAL = 1
+    SIG_DIGITS = 2
+
+    def __init__(self, orgs, genes, scores=None):
+        """
+        Constructor
+        :param list orgs: organisms of the first two axes
+        :param list genes: genes of the third axis
+        :param scores: array of scores, all scores are neutral when not given
+        """
+        self.orgs = list(orgs)
+        self.genes = list(genes)
+        if scores is None:
+            scores = np.full((len(self.orgs), len(self.orgs), len(self.genes)), self.NEUTRAL, dtype=np.float32)
+        self.scores = scores
+        self.org_idx = {org: idx for idx, org in enumerate(self.orgs)}
+        self.gene_idx = {gene: idx for idx, gene in enumerate(self.genes)}
+
+    @staticmethod
+    def get_default_path():
+        """ Builds and returns the path of the scores file, the index is stored next to it """
+        return os.path.join(os.getcwd(), "src", "data", "dnds", "scores.npy")
+
+    @staticmethod
+    def _get_index_path(path):
+        """ Returns the path of the index of the given scores file """
+        return "{}_index.json".format(os.path.splitext(path)[0])
+
+    @classmethod
+    def load(cls, path=None):
+        """ Memory-maps the scores file at the given path, or the default path, and returns the tensor """
+        path = path if path else cls.get_default_path()
+        with open(cls._get_index_path(path), "r") as f:
+            index = json.load(f)
+        return cls(index.get("organisms"), index.get("genes"), np.load(path, mmap_mode="r"))
+
+    @classmethod
+    def from_dict(cls, final):
+        """ Builds a tensor from a dictionary of scores keyed on org1, org2, and gene """
+        orgs = list(final.keys())
+        genes = list(final[orgs[0]][orgs[0]].keys()) if orgs else []
+        tensor = cls(orgs, genes)
+        for org1, others in final.items():
+            for org2, scores in others.items():
+                for gene, score in scores.items():
+                    tensor.scores[tensor.org_idx[org1], tensor.org_idx[org2], tensor.gene_idx[gene]] = score
+        return tensor
+
+    @classmethod
+    def from_csv_dir(cls, orgs, dir_path=None):
+        """ Builds a tensor from the per-organism heatmap CSVs that used to be written by dnds/visualizer """
+        dir_path = dir_path if dir_path else os.path.join(os.getcwd(), "src", "data", "dnds")
+        tensor = None
+        for org1 in orgs:
+            with open(os.path.join(dir_path, "{}.csv".format(org1)), "r") as f:
+                rows = list(csv.reader(f))
+            if tensor is None:
+                tensor = cls(orgs, rows[0][1:])
+            for row in rows[1:]:
+                tensor.scores[tensor.org_idx[org1], tensor.org_idx[row[0]]] = [float(x) for x in row[1:]]
+        return tensor
+
+    def save(self, path=None):
+        """ Saves the scores and their index at the given path, or the default path """
+        path = path if path else self.get_default_path()
+        np.save(path, np.asarray(self.scores, dtype=np.float32))
+        with open(self._get_index_path(path), "w") as f:
+            json.dump({"organisms": self.orgs, "genes": self.genes}, f, indent=2)
+
+    def to_csv_dir(self, dir_path=None):
+        """ Exports the scores as the per-organism heatmap CSVs versioned in src/data/dnds, see from_csv_dir """
+        dir_path = dir_path if dir_path else os.path.join(os.getcwd(), "src", "data", "dnds")
+        for org in self.orgs:
+            self.frame(org).to_csv(os.path.join(dir_path, "{}.csv".format(org)), index=False)
+
+    def set_pair(self, org1, org2, gene, score):
+        """ Sets the score of a pair of organisms for a gene, in both directions as dnds is symmetric """
+        i, j, g = self.org_idx[org1], self.org_idx[org2], self.gene_idx[gene]
+        self.scores[i, j, g] = score
+        self.scores[j, i, g] = score
+
+    def get(self, org1, org2, gene):
+        """ Returns the score of a pair of organisms for a gene """
+        return round(float(self.scores[self.org_idx[org1], self.org_idx[org2], self.gene_idx[gene]]), self.SIG_DIGITS)
+
+    def others(self, org):
+        """ Returns the organisms scored against the given one, excluding itself """
+        return [o for o in self.orgs if o != org]
+
+    def values(self, org):
+        """ Returns the (other organisms x genes) array of scores of the given organism """
+        others = [self.org_idx[o] for o in self.others(org)]
+        # float32 cannot hold 2 decimals exactly, round after widening so values read like the original scores
+        return np.round(np.asarray(self.scores[self.org_idx[org], others], dtype=np.float64), self.SIG_DIGITS)
+
+    def frame(self, org):
+        """ Returns the scores of the given organism as a dataframe shaped like the original per-organism CSVs """
+        df = pd.DataFrame(self.values(org), columns=self.genes)
+        df.insert(0, self.ORGANISM, self.others(org))
+        return df
+
+    def to_dict(self):
+        """ Returns the scores as a dictionary keyed on org1, org2, and gene """
+        return {org1: {org2: {gene: self.get(org1, org2, gene) for gene in self.genes} for org2 in self.orgs}
+                for org1 in self.orgs}
+
+
+if __name__ == "__main__":
+    # converts the per-organism heatmap CSVs into the scores tensor
+    with open(os.path.join(os.getcwd(), "src", "data", "phylogeny", "significant_organisms.txt"), "r") as sig:
+        sig.readline()  # don't care about the top line
+        sig_orgs = ["_".join(line.split(",")[1].lower().split()) for line in sig.readlines()]
+    ScoreTensor.from_csv_dir(sig_orgs).save()
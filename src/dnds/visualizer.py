@@ -2,46 +2,32 @@ import os
 
 import matplotlib.pyplot as plt
 import numpy as np
-import pandas as pd
 import seaborn as sn
 
-from src.dnds import loader
+from src.dnds import constants, loader
 
 
 class Visualizer(loader.Loader):
     """ Responsible for creating dn/ds visualizations for all the studied genes """
 
-    def __init__(self):
-        """ Constructor """
-        super(Visualizer, self).__init__()
-        self._create_heatmap_csv()
-
-    def _create_heatmap_csv(self):
-        """ Creates a heatmap CSV file for visualizing the results """
-        for sig_org in self.scores.keys():
-            sig_org_file_path = os.path.join(os.getcwd(), "src", "data", "dnds", "{}.csv".format(sig_org))
-            with open(sig_org_file_path, "w") as sof:
-                header = "organism,"
-                # each org will have itself in the dnds dictionary
-                # we only want this to build the header once
-                for k in self.scores[sig_org][sig_org].keys():
-                    header += "{},".format(k)
-                header = header[:len(header) - 1]  # remove the last ","
-                header += "\n"
-                sof.write(header)
-                for org in self.scores[sig_org].keys():
-                    if sig_org == org:  # no point in adding the same one
-                        continue
-                    vals = ",".join([str(x) for x in self.scores[sig_org][org].values()])
-                    line = "{},{}\n".format(org, vals)
-                    sof.write(line)
+    def __init__(self, backend=constants.Backends.R, workers=1, use_cache=True, use_journal=True):
+        """
+        Constructor
+        :param str backend: engine used to compute the dnds scores, one of constants.Backends
+        :param int workers: number of processes computing the dnds scores, None uses all the CPUs
+        :param bool use_cache: whether to reuse the scores persisted in the on-disk dnds/cache
+        :param bool use_journal: whether to checkpoint scores as they are computed and resume interrupted runs
+        """
+        super(Visualizer, self).__init__(backend=backend, workers=workers, use_cache=use_cache,
+                                         use_journal=use_journal)
+        self.scores.save()
+        self.scores.to_csv_dir()  # the versioned results, the tensor itself is not versioned
 
     def visualize(self):
         """ Creates the 2D dn/ds plots for each gene """
         plt.figure(figsize=(20, 20))
-        for sig_org in self.scores.keys():
-            sig_org_csv = os.path.join(os.getcwd(), "src", "data", "dnds", "{}.csv".format(sig_org))
-            df = pd.read_csv(sig_org_csv)
+        for sig_org in self.scores.orgs:
+            df = self.scores.frame(sig_org)
 
             x_vals = df.columns[1:]
             y_vals = df.organism
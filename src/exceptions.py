@@ -41,3 +41,21 @@ class BlastDictionaryAccessException(PGException):
 class EmptyNamespaceClassException(PGException):
     """ An exception used for indicating that no namespace class has been passed for binning organisms """
     pass
+
+
+class UnknownBackendException(PGException):
+    """ An exception used for indicating that an unknown dN/dS backend has been requested """
+    pass
+
+
+class MalformedAlignmentException(PGException):
+    """ An exception used for indicating that a multiple sequence alignment cannot be packed or read back """
+    pass
+
+
+class FetchException(PGException):
+    """ An exception used for indicating that a URL could not be fetched, holding the last HTTP status code if any """
+
+    def __init__(self, message, status_code=None):
+        super().__init__(message)
+        self.status_code = status_code
@@ -0,0 +1,66 @@
+class Reader:
+    """ Reader is responsible for streaming the records of a FASTA file, such as the 60 character per line MSAs in
+    data/alignments. Records are yielded one at a time as (name, sequence) and the lines of a sequence are joined once
+    per record rather than concatenated line by line """
+
+    HEADER = ">"
+
+    def __init__(self, path, as_bytes=False, names=None):
+        """
+        Constructor
+        :param str path: path to the FASTA file
+        :param bool as_bytes: whether to yield the names and sequences as bytes rather than str
+        :param names: set of record names to keep, as str, all records are kept when not given. The sequence lines of
+        the other records are skipped without being kept
+        """
+        self.path = path
+        self.as_bytes = as_bytes
+        self.names = None if names is None else \
+            {name.encode("ascii") for name in names} if as_bytes else set(names)
+
+    def __iter__(self):
+        """ Yields the (name, sequence) records of the file """
+        header = self.HEADER.encode("ascii") if self.as_bytes else self.HEADER
+        empty = b"" if self.as_bytes else ""
+        with open(self.path, "rb" if self.as_bytes else "r") as f:
+            name, chunks, keep = None, [], False
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue  # it can happen that we have empty lines
+                if line.startswith(header):
+                    if keep:
+                        yield name, empty.join(chunks)
+                    name, chunks = line[1:].strip(), []
+                    keep = self.names is None or name in self.names
+                elif keep:
+                    chunks.append(line)
+            if keep:
+                yield name, empty.join(chunks)
+
+
+class Writer:
+    """ Writer is responsible for writing FASTA records through a buffered file """
+
+    BUFFER_SIZE = 1024 * 1024
+
+    def __init__(self, path):
+        """
+        Constructor
+        :param str path: path to the FASTA file, overwritten if it exists
+        """
+        self.out = open(path, "w", buffering=self.BUFFER_SIZE)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def write(self, name, sequence):
+        """ Writes a record, with its sequence on a single line """
+        self.out.write(">{}\n{}\n".format(name, sequence))
+
+    def close(self):
+        """ Flushes the buffered records and closes the file """
+        self.out.close()
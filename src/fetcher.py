@@ -0,0 +1,181 @@
+import email.utils
+import threading
+import time
+from concurrent import futures
+
+import requests
+from requests import adapters
+
+from src import exceptions
+
+
+class TokenBucket:
+    """ A thread-safe token bucket that limits the rate of requests, which can also be paused altogether when a server
+    asks clients to back off """
+
+    def __init__(self, rate, capacity=None):
+        """
+        Constructor
+        :param float rate: number of tokens added per second
+        :param int capacity: maximum number of tokens, i.e. the size of a burst, defaults to the rate
+        """
+        self.rate = rate
+        self.capacity = capacity if capacity else max(rate, 1)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.paused_until = 0
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        """ Blocks until a token is available and takes it """
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if now >= self.paused_until and self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = max(self.paused_until - now, (1 - self.tokens) / self.rate)
+            time.sleep(wait)
+
+    def pause(self, seconds):
+        """ Holds back every request for the given number of seconds """
+        with self.lock:
+            self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+            self.tokens = 0
+
+
+class Fetcher:
+    """ Fetcher is responsible for fetching many URLs concurrently from rate-limited REST APIs, such as Ensembl and EBI.
+    Requests are spread over a pool of threads, each one with its own pooled requests session, and go through a shared
+    TokenBucket. Server errors and rate limiting responses are retried with exponential backoff, honouring the
+    Retry-After and X-RateLimit headers """
+
+    RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+
+    def __init__(self, concurrency=4, rate=10, retries=5, backoff=1.0, timeout=60, headers=None, cache=None):
+        """
+        Constructor
+        :param int concurrency: number of requests in flight at once
+        :param float rate: maximum number of requests per second
+        :param int retries: number of times a request is retried after a retryable failure
+        :param float backoff: seconds waited before the first retry, doubled on every further retry
+        :param float timeout: seconds before a request times out
+        :param dict headers: headers sent with every request
+        :param httpcache.Cache cache: cache of the responses, revalidated with conditional requests, none when not given
+        """
+        self.concurrency = concurrency
+        self.bucket = TokenBucket(rate)
+        self.retries = retries
+        self.backoff = backoff
+        self.timeout = timeout
+        self.headers = headers if headers else {}
+        self.cache = cache
+        self._local = threading.local()
+
+    def _get_session(self):
+        """ Returns the session of the current thread, which keeps its connections alive across requests """
+        session = getattr(self._local, "session", None)
+        if session is None:
+            session = requests.Session()
+            adapter = adapters.HTTPAdapter(pool_connections=1, pool_maxsize=1)
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+            session.headers.update(self.headers)
+            self._local.session = session
+        return session
+
+    def _get_retry_after(self, response):
+        """ Returns the seconds to wait asked for by the Retry-After header of a response, None if absent """
+        value = response.headers.get("Retry-After")
+        if value is None:
+            return None
+        try:
+            return max(float(value), 0)
+        except ValueError:
+            date = email.utils.parsedate_to_datetime(value)
+            return max(date.timestamp() - time.time(), 0)
+
+    def _respect_rate_headers(self, response):
+        """ Pauses all requests until the rate limit window resets when a response says no requests are left """
+        remaining = response.headers.get("X-RateLimit-Remaining")
+        reset = response.headers.get("X-RateLimit-Reset")
+        if remaining is not None and reset is not None:
+            try:
+                if int(float(remaining)) <= 0:
+                    self.bucket.pause(float(reset))
+            except ValueError:
+                pass
+
+    def request(self, url, headers=None):
+        """
+        Fetches a URL, retrying server errors, rate limiting responses, and transport errors (connection, timeout,
+        truncated or undecodable bodies, redirect loops), which are raised as FetchException once retries run out
+        :param str url: URL to fetch
+        :param dict headers: headers of this request, on top of the fetcher headers
+        :return: the requests response, which can be any status code that is not retried (e.g. 200, 304, 404)
+        """
+        status_code = None
+        for attempt in range(self.retries + 1):
+            self.bucket.acquire()
+            wait = self.backoff * 2 ** attempt
+            try:
+                response = self._get_session().get(url, headers=headers, timeout=self.timeout)
+            except requests.RequestException as e:
+                if attempt == self.retries:
+                    raise exceptions.FetchException("Failed to fetch {}: {}".format(url, e))
+                time.sleep(wait)
+                continue
+            self._respect_rate_headers(response)
+            if response.status_code not in self.RETRY_STATUS_CODES:
+                return response
+            status_code = response.status_code
+            retry_after = self._get_retry_after(response)
+            if retry_after is not None:
+                wait = retry_after
+                self.bucket.pause(wait)
+            if attempt < self.retries:
+                time.sleep(wait)
+        message = "Failed to fetch {}, last status code: {}".format(url, status_code)
+        raise exceptions.FetchException(message, status_code)
+
+    def fetch(self, url, headers=None):
+        """
+        Fetches a URL and returns its body, raising FetchException on any status code other than 200. With a cache,
+        a cached body is revalidated with a conditional request and served on 304 Not Modified, and an offline cache
+        serves cached bodies without any request
+        """
+        cached = self.cache.get(url) if self.cache else None
+        if self.cache and self.cache.offline:
+            if cached is None:
+                raise exceptions.FetchException("{} is not cached and the cache is offline".format(url))
+            return cached.body
+        if cached:
+            headers = dict(headers if headers else {}, **cached.conditional_headers())
+        response = self.request(url, headers)
+        if cached and response.status_code == 304:
+            self.cache.revalidated(url, response.headers.get("ETag"), response.headers.get("Last-Modified"))
+            return cached.body
+        if response.status_code != 200:
+            message = "Failed to fetch {}, status code: {}".format(url, response.status_code)
+            raise exceptions.FetchException(message, response.status_code)
+        if self.cache:
+            self.cache.put(url, response.text, response.headers.get("ETag"), response.headers.get("Last-Modified"))
+        return response.text
+
+    def fetch_all(self, urls, headers=None):
+        """
+        Fetches URLs concurrently
+        :param dict urls: URLs to fetch keyed on any key, e.g. gene ID
+        :param dict headers: headers of these requests, on top of the fetcher headers
+        :return: generator of (key, body, exception) tuples as the requests complete, where either the body or the
+        exception is None
+        """
+        with futures.ThreadPoolExecutor(max_workers=self.concurrency) as pool:
+            submitted = {pool.submit(self.fetch, url, headers): key for key, url in urls.items()}
+            for future in futures.as_completed(submitted):
+                try:
+                    yield submitted[future], future.result(), None
+                except exceptions.FetchException as e:
+                    yield submitted[future], None, e
@@ -1,7 +1,8 @@
-import json
 import os
+from concurrent import futures
 
-from src import exceptions
+from src import exceptions, jsonstream
+from src.genes import hits
 
 
 class BlastKeys:
@@ -30,10 +31,6 @@ class BlastKeys:
 class Blaster:
     """ Responsible for parsing the gene trees BLAST results """
     SIG_DIGITS = 3
-    ORG_TITLE_IDX = 0
-    QRY_COV_IDX = 1
-    E_VAL_IDX = 2
-    IDENTITY_IDX = 3
 
     def __init__(self):
         self.blast_files = self._get_blast_file_paths()
@@ -47,87 +44,124 @@ class Blaster:
             paths.append(os.path.join(path, f))
         return paths
 
-    def _parse_blast_output(self, blast_output):
+    def _parse_hsps(self, hit, query_len):
         """
-        Parses the output of a given BLAST result
-        :param dict blast_output: the BLAST result as a dictionary
-        :return: tuple of results (org scientific name, % query cover, e-value, % identity)
+        Parses every HSP of a single hit of a BLAST result, without any filtering
+        :param dict hit: the BLAST hit, with its hsps and description
+        :param int query_len: length of the BLAST query
+        :return: list of (title, species, % query cover, e-value, % identity, alignment length) tuples
         """
-        output = blast_output.get(BlastKeys.OUTPUT)
-        if not output:
-            raise exceptions.BlastDictionaryAccessException("BLAST output not accessible")
-        output = output[0]  # don't know why it's a list
-        report = output.get(BlastKeys.REPORT)
-        if not report:
-            raise exceptions.BlastDictionaryAccessException("BLAST report not accessible")
-
-        results = report.get(BlastKeys.RESULTS)
-        if not results:
-            raise exceptions.BlastDictionaryAccessException("BLAST results not accessible")
-
-        search = results.get(BlastKeys.SEARCH)
-        if not search:
-            raise exceptions.BlastDictionaryAccessException("BLAST search results not accessible")
-
-        hits = search.get(BlastKeys.HITS)
-        if not hits:
+        hit_description = hit.get(BlastKeys.DESCRIPTION)[0]  # not sure why this is a list
+        org_title = hit_description.get(BlastKeys.TITLE)
+        species = hit_description.get(BlastKeys.SCIENTIFIC_NAME, org_title)
+        rows = []
+        for hsp in hit.get(BlastKeys.HIT_SPECIES):
+            query_diff = hsp.get(BlastKeys.QUERY_TO) - hsp.get(BlastKeys.QUERY_FROM)
+            query_coverage = round(query_diff / query_len, self.SIG_DIGITS) * 100
+            identity = round(hsp.get(BlastKeys.IDENTITY) / hsp.get(BlastKeys.ALIGNMENT_LENGTH), self.SIG_DIGITS) * 100
+            rows.append((org_title, species, query_coverage, hsp.get(BlastKeys.E_VALUE), identity,
+                         hsp.get(BlastKeys.ALIGNMENT_LENGTH)))
+        return rows
+
+    def _stream_hits(self, blast_file):
+        """
+        Streams the hits of a BLAST JSON file one at a time rather than loading the whole document, so memory is
+        bounded by the largest hit
+        :param str blast_file: path to the BLAST JSON file
+        :return: generator of (hit, query length) tuples
+        """
+        walker = jsonstream.Walker(blast_file, [BlastKeys.OUTPUT, 0, BlastKeys.REPORT, BlastKeys.RESULTS,
+                                                BlastKeys.SEARCH, BlastKeys.HITS])
+        pending = []  # hits seen before the query length, which BLAST writes ahead of the hits
+        num_hits = 0
+        try:
+            for hit in walker:
+                num_hits += 1
+                query_len = walker.siblings.get(BlastKeys.QUERY_LENGTH)
+                if query_len is None:
+                    pending.append(hit)
+                    continue
+                for pending_hit in pending:
+                    yield pending_hit, query_len
+                pending = []
+                yield hit, query_len
+        except KeyError:
+            raise exceptions.BlastDictionaryAccessException("BLAST hits not accessible")
+        if not num_hits:
             raise exceptions.BlastDictionaryAccessException("BLAST hits not accessible")
+        for pending_hit in pending:
+            yield pending_hit, walker.siblings.get(BlastKeys.QUERY_LENGTH)
 
-        results = []
-        query_len = search.get(BlastKeys.QUERY_LENGTH)
-        # there can be multiple hits if BLAST decides to use the complete genome sequence of an organism
-        # for multiple hits, we only care about the scores of the ones with high query coverage
-        # so we set the return values according to that
-        for hit in hits:
-            query_coverage = 0
-            identity = 0
-            align_total = 0
-            e_val = float('-inf')
-            hsps = hit.get(BlastKeys.HIT_SPECIES)
-            for hsp in hsps:
-                curr_query_diff = hsp.get(BlastKeys.QUERY_TO) - hsp.get(BlastKeys.QUERY_FROM)
-                curr_query = round(curr_query_diff / query_len, self.SIG_DIGITS) * 100
-                # we set the e-value, identity, and title according to query coverage
-                if curr_query > query_coverage:
-                    query_coverage = curr_query
-                    curr_identity = round(hsp.get(BlastKeys.IDENTITY) / hsp.get(BlastKeys.ALIGNMENT_LENGTH),
-                                          self.SIG_DIGITS) * 100
-                    identity = max(identity, curr_identity)
-                    align_total += hsp.get(BlastKeys.ALIGNMENT_LENGTH)
-                    e_val = max(e_val, hsp.get(BlastKeys.E_VALUE))
-
-            # if we're here, it's fine to process the dict, it'll have something, no exception
-            hit_description = hit.get(BlastKeys.DESCRIPTION)[0]  # not sure why this is a list
-            org_title = hit_description.get(BlastKeys.TITLE)
-            if query_coverage < BlastKeys.QUERY_COVER_LIMIT:
-                continue
-            results.append((org_title, query_coverage, e_val, identity))
-        return results
-
-    def parse_blast_files(self):
-        """ Parses the BLAST files and builds """
+    def _parse_gene(self, blast_file):
+        """
+        Parses every HSP of the BLAST file of a gene
+        :param str blast_file: path to the BLAST JSON file
+        :return: tuple of the gene name and its list of (hit, title, species, % query cover, e-value, % identity,
+        alignment length) tuples, empty if the hits are not accessible
+        """
+        gene_name = blast_file.split("/")[-1].split(".")[0]
+        rows = []
+        try:
+            for hit_idx, (hit, query_len) in enumerate(self._stream_hits(blast_file)):
+                rows.extend((hit_idx,) + row for row in self._parse_hsps(hit, query_len))
+        except exceptions.BlastDictionaryAccessException:
+            return gene_name, []  # can safely skip
+        return gene_name, rows
+
+    def build_hit_table(self, workers=1):
+        """
+        Parses the BLAST files into a columnar table of all their HSPs, regardless of query coverage
+        :param int workers: number of worker processes parsing the files, None uses all the CPUs
+        :return: hits.HitTable
+        """
+        if workers == 1:
+            parsed = [self._parse_gene(blast_file) for blast_file in self.blast_files]
+        else:
+            with futures.ProcessPoolExecutor(max_workers=workers) as pool:
+                parsed = list(pool.map(self._parse_gene, self.blast_files))
+        return hits.HitTable.from_rows(parsed)
+
+    def _format_e_value(self, e_val):
+        """ Formats an e-value as BLAST reports it, where a zero e-value is an integer """
+        return int(e_val) if float(e_val).is_integer() else e_val
+
+    def write_blast_results(self, table, min_coverage=BlastKeys.QUERY_COVER_LIMIT):
+        """
+        Renders the BLAST results file from a table of hits, genes are sorted by name
+        :param hits.HitTable table: table of the BLAST hits
+        :param float min_coverage: minimum % query coverage of the reported hits
+        """
+        found = table.query(min_coverage=min_coverage)
+        genes = found.get(hits.HitColumns.GENE)
+        titles = found.get(hits.HitColumns.TITLE)
+        query_coverages = found.get(hits.HitColumns.QUERY_COVERAGE)
+        e_values = found.get(hits.HitColumns.E_VALUE)
+        identities = found.get(hits.HitColumns.IDENTITY)
         blast_results_file = os.path.join(os.getcwd(), "src", "data", "genes", "blast_results.txt")
         with open(blast_results_file, "w") as brf:
             # make a nice header, otherwise it's hard to understand the format b/c of long titles
             brf.write("GENE NAME\nORGANISM TITLE\nQUERY COVERAGE (%), E-VALUE, IDENTITY (%)\n\n")
 
-            for blast_file in self.blast_files:
-                gene_name = blast_file.split("/")[-1].split(".")[0]
-                with open(blast_file, "r") as bf:
-                    blast = json.load(bf)
-                    try:
-                        orgs = self._parse_blast_output(blast)
-                    except exceptions.BlastDictionaryAccessException:
-                        continue  # can safely skip
-                    if not orgs:
-                        continue
-                    else:
-                        brf.write("{}\n".format(gene_name))
-                        for o in orgs:
-                            brf.write("{}\n".format(o[self.ORG_TITLE_IDX]))
-                            vals = "{}%, {}, {}%\n".format(o[self.QRY_COV_IDX], o[self.E_VAL_IDX], o[self.IDENTITY_IDX])
-                            brf.write(vals)
-                        brf.write("\n")
+            for idx in range(len(genes)):
+                if idx == 0 or genes[idx] != genes[idx - 1]:
+                    brf.write("{}\n".format(table.genes[genes[idx]]))
+                brf.write("{}\n".format(table.titles[titles[idx]]))
+                vals = "{}%, {}, {}%\n".format(query_coverages[idx], self._format_e_value(e_values[idx]),
+                                               identities[idx])
+                brf.write(vals)
+                if idx == len(genes) - 1 or genes[idx] != genes[idx + 1]:
+                    brf.write("\n")
+
+    def parse_blast_files(self, workers=1):
+        """
+        Parses the BLAST files, saves the table of all their HSPs to src/data/genes/blast_hits.npz, and renders the
+        BLAST results file from it, where genes are sorted by name so that the output does not depend on the order of
+        the files or of the workers
+        :param int workers: number of worker processes parsing the files, None uses all the CPUs
+        """
+        table = self.build_hit_table(workers=workers)
+        table.save()
+        self.write_blast_results(table)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,182 @@
+import os
+
+import numpy as np
+
+
+class HitColumns:
+    """ A namespace of the columns of a HitTable, every row of which is a single HSP of a BLAST hit """
+    GENE = "gene"  # index into HitTable.genes
+    HIT = "hit"  # index of the hit within its gene, HSPs of the same hit share it
+    TITLE = "title"  # index into HitTable.titles
+    SPECIES = "species"  # index into HitTable.species
+    QUERY_COVERAGE = "query_coverage"  # % of the query covered by the HSP
+    E_VALUE = "e_value"
+    IDENTITY = "identity"  # % identity of the HSP
+    ALIGNMENT_LENGTH = "align_len"
+
+
+class HitTable:
+    """ A columnar table of BLAST HSPs, where strings are stored once in the genes, titles, and species lists and
+    referenced by index, so thresholds can be swept over the whole table with NumPy instead of re-parsing the BLAST
+    JSON files. Rows are ordered by gene and then by hit, in the order of the BLAST reports """
+
+    STRING_LISTS = ("gene_names", "title_names", "species_names")
+
+    def __init__(self, genes, titles, species, columns):
+        """
+        Constructor
+        :param list genes: gene names, sorted
+        :param list titles: hit titles
+        :param list species: hit species (scientific names)
+        :param dict columns: arrays of the table keyed on HitColumns
+        """
+        self.genes = genes
+        self.titles = titles
+        self.species = species
+        self.columns = columns
+        self._gene_idx = {gene: idx for idx, gene in enumerate(genes)}
+        self._species_idx = {name: idx for idx, name in enumerate(species)}
+        self._gene_rows = None
+        self._species_rows = None
+
+    @classmethod
+    def get_default_path(cls):
+        """ Returns the default path of the table, src/data/genes/blast_hits.npz """
+        return os.path.join(os.getcwd(), "src", "data", "genes", "blast_hits.npz")
+
+    @classmethod
+    def from_rows(cls, parsed):
+        """
+        Builds a table from parsed BLAST files
+        :param list parsed: (gene, rows) tuples, where rows are (hit, title, species, query coverage, e-value, identity,
+        alignment length) tuples, one per HSP
+        :return: HitTable
+        """
+        parsed = sorted(parsed, key=lambda gene: gene[0])
+        genes = [gene for gene, _ in parsed]
+        titles, species = {}, {}
+        gene_col, hit_col, title_col, species_col = [], [], [], []
+        coverage, e_value, identity, align_len = [], [], [], []
+        for gene_idx, (_, rows) in enumerate(parsed):
+            for hit, title, sciname, cov, e_val, ident, length in rows:
+                gene_col.append(gene_idx)
+                hit_col.append(hit)
+                title_col.append(titles.setdefault(title, len(titles)))
+                species_col.append(species.setdefault(sciname, len(species)))
+                coverage.append(cov)
+                e_value.append(e_val)
+                identity.append(ident)
+                align_len.append(length)
+        columns = {
+            HitColumns.GENE: np.array(gene_col, dtype=np.int32),
+            HitColumns.HIT: np.array(hit_col, dtype=np.int32),
+            HitColumns.TITLE: np.array(title_col, dtype=np.int32),
+            HitColumns.SPECIES: np.array(species_col, dtype=np.int32),
+            HitColumns.QUERY_COVERAGE: np.array(coverage, dtype=np.float64),
+            HitColumns.E_VALUE: np.array(e_value, dtype=np.float64),
+            HitColumns.IDENTITY: np.array(identity, dtype=np.float64),
+            HitColumns.ALIGNMENT_LENGTH: np.array(align_len, dtype=np.int32),
+        }
+        return cls(genes, list(titles.keys()), list(species.keys()), columns)
+
+    @classmethod
+    def load(cls, path=None):
+        """ Loads a table saved with save """
+        path = path if path else cls.get_default_path()
+        with np.load(path) as data:
+            columns = {name: data[name] for name in data.files if name not in cls.STRING_LISTS}
+            return cls(data["gene_names"].tolist(), data["title_names"].tolist(), data["species_names"].tolist(),
+                       columns)
+
+    def save(self, path=None):
+        """ Saves the table as a single compressed .npz file of its columns and string lists """
+        path = path if path else self.get_default_path()
+        np.savez_compressed(path, gene_names=np.array(self.genes, dtype=str),
+                            title_names=np.array(self.titles, dtype=str),
+                            species_names=np.array(self.species, dtype=str), **self.columns)
+
+    def __len__(self):
+        return len(self.columns.get(HitColumns.GENE))
+
+    def gene_rows(self, gene):
+        """ Returns the indices of the rows of the given gene """
+        if self._gene_rows is None:
+            genes = self.columns.get(HitColumns.GENE)
+            bounds = np.searchsorted(genes, np.arange(len(self.genes) + 1))
+            self._gene_rows = {g: np.arange(bounds[idx], bounds[idx + 1]) for idx, g in enumerate(self.genes)}
+        return self._gene_rows.get(gene, np.zeros(0, dtype=np.int64))
+
+    def species_rows(self, name):
+        """ Returns the indices of the rows of the given species """
+        if self._species_rows is None:
+            species = self.columns.get(HitColumns.SPECIES)
+            order = np.argsort(species, kind="stable")
+            bounds = np.searchsorted(species[order], np.arange(len(self.species) + 1))
+            self._species_rows = {s: order[bounds[idx]:bounds[idx + 1]] for idx, s in enumerate(self.species)}
+        return self._species_rows.get(name, np.zeros(0, dtype=np.int64))
+
+    def genes_of_species(self, name):
+        """ Returns the sorted names of the genes with at least one hit in the given species """
+        return [self.genes[idx] for idx in np.unique(self.columns.get(HitColumns.GENE)[self.species_rows(name)])]
+
+    def species_of_gene(self, gene):
+        """ Returns the sorted names of the species hit by the given gene """
+        return sorted({self.species[idx] for idx in self.columns.get(HitColumns.SPECIES)[self.gene_rows(gene)]})
+
+    def summarize_hits(self):
+        """
+        Summarizes the HSPs of every hit the same way as the BLAST text report: walking the HSPs in order, the query
+        coverage is the largest one, while the identity and e-value are the largest among the HSPs that raised the
+        coverage
+        :return: dictionary of hit-level arrays keyed on HitColumns, without ALIGNMENT_LENGTH
+        """
+        gene, hit = self.columns.get(HitColumns.GENE), self.columns.get(HitColumns.HIT)
+        if not len(gene):
+            return {name: column[:0] for name, column in self.columns.items() if name != HitColumns.ALIGNMENT_LENGTH}
+        first = np.r_[True, (gene[1:] != gene[:-1]) | (hit[1:] != hit[:-1])]  # first HSP of every hit
+        starts = np.flatnonzero(first)
+        group = np.cumsum(first) - 1
+        coverage = self.columns.get(HitColumns.QUERY_COVERAGE)
+        # running max of the coverage within every hit, over integer ranks offset per hit so that a single exact
+        # accumulate does all the hits, where rank 0 stands for the initial coverage of 0
+        levels, ranks = np.unique(np.r_[0, coverage], return_inverse=True)
+        ranks = ranks[1:].astype(np.int64) - np.searchsorted(levels, 0)
+        offset = group * (len(levels) + 1)
+        running = np.maximum.accumulate(np.maximum(ranks, 0) + offset) - offset
+        previous = np.r_[0, running[:-1]]
+        previous[starts] = 0
+        raised = ranks > previous
+        identity = np.where(raised, self.columns.get(HitColumns.IDENTITY), 0)
+        e_value = np.where(raised, self.columns.get(HitColumns.E_VALUE), -np.inf)
+        return {
+            HitColumns.GENE: gene[starts],
+            HitColumns.HIT: hit[starts],
+            HitColumns.TITLE: self.columns.get(HitColumns.TITLE)[starts],
+            HitColumns.SPECIES: self.columns.get(HitColumns.SPECIES)[starts],
+            HitColumns.QUERY_COVERAGE: np.maximum(np.maximum.reduceat(coverage, starts), 0),
+            HitColumns.E_VALUE: np.maximum.reduceat(e_value, starts),
+            HitColumns.IDENTITY: np.maximum.reduceat(identity, starts),
+        }
+
+    def query(self, min_coverage=0, max_e_value=None, min_identity=None, genes=None, species=None):
+        """
+        Filters the hits of the table, see summarize_hits, with vectorized thresholds
+        :param float min_coverage: minimum % query coverage of a hit
+        :param float max_e_value: maximum e-value of a hit, not filtered when not given
+        :param float min_identity: minimum % identity of a hit, not filtered when not given
+        :param genes: names of the genes to keep, all genes when not given
+        :param species: names of the species to keep, all species when not given
+        :return: dictionary of hit-level arrays keyed on HitColumns
+        """
+        hits = self.summarize_hits()
+        keep = hits.get(HitColumns.QUERY_COVERAGE) >= min_coverage
+        if max_e_value is not None:
+            keep &= hits.get(HitColumns.E_VALUE) <= max_e_value
+        if min_identity is not None:
+            keep &= hits.get(HitColumns.IDENTITY) >= min_identity
+        if genes is not None:
+            keep &= np.isin(hits.get(HitColumns.GENE), [self._gene_idx[g] for g in genes if g in self._gene_idx])
+        if species is not None:
+            keep &= np.isin(hits.get(HitColumns.SPECIES),
+                            [self._species_idx[s] for s in species if s in self._species_idx])
+        return {name: column[keep] for name, column in hits.items()}
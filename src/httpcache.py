@@ -0,0 +1,102 @@
+import os
+import sqlite3
+import threading
+import time
+import zlib
+
+
+class CachedResponse:
+    """ A response body stored by the Cache, with the validators used to revalidate it """
+
+    def __init__(self, url, body, etag, last_modified, fetched):
+        """
+        Constructor
+        :param str url: URL of the response
+        :param str body: decompressed body of the response
+        :param str etag: ETag header of the response, None if absent
+        :param str last_modified: Last-Modified header of the response, None if absent
+        :param float fetched: time the response was last fetched or revalidated
+        """
+        self.url = url
+        self.body = body
+        self.etag = etag
+        self.last_modified = last_modified
+        self.fetched = fetched
+
+    def conditional_headers(self):
+        """ Returns the headers that ask the server to only send the resource back if it changed """
+        headers = {}
+        if self.etag:
+            headers["If-None-Match"] = self.etag
+        if self.last_modified:
+            headers["If-Modified-Since"] = self.last_modified
+        return headers
+
+
+class Cache:
+    """ Responsible for persisting HTTP responses on disk, keyed on URL, with zlib compressed bodies and their ETag and
+    Last-Modified validators, so that the Ensembl and EBI collectors revalidate unchanged resources with conditional
+    requests rather than downloading them again, or run offline from what was cached before """
+
+    COMPRESSION_LEVEL = 6
+
+    def __init__(self, path=None, offline=False):
+        """
+        Constructor
+        :param str path: path to the SQLite file holding the responses, defaults to src/data/http_cache.sqlite
+        :param bool offline: whether responses are only ever served from the cache, without any request
+        """
+        self.path = path if path else self._get_default_path()
+        self.offline = offline
+        self.hits = 0
+        self.misses = 0
+        self.revalidations = 0
+        # the fetcher threads share a single connection, one at a time
+        self.lock = threading.Lock()
+        self.connection = self._connect()
+
+    def _get_default_path(self):
+        """ Builds and returns the default path of the cache file """
+        return os.path.join(os.getcwd(), "src", "data", "http_cache.sqlite")
+
+    def _connect(self):
+        """ Opens the cache file and creates the responses table if needed """
+        connection = sqlite3.connect(self.path, timeout=60, check_same_thread=False)
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute("CREATE TABLE IF NOT EXISTS responses (url TEXT PRIMARY KEY, body BLOB, etag TEXT, "
+                           "last_modified TEXT, fetched REAL)")
+        connection.commit()
+        return connection
+
+    def get(self, url):
+        """ Returns the CachedResponse of the given URL, None if the URL is not cached """
+        with self.lock:
+            row = self.connection.execute("SELECT body, etag, last_modified, fetched FROM responses WHERE url = ?",
+                                          (url,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+        body, etag, last_modified, fetched = row
+        return CachedResponse(url, zlib.decompress(body).decode("utf-8"), etag, last_modified, fetched)
+
+    def put(self, url, body, etag=None, last_modified=None):
+        """ Stores the body of the response of the given URL along with its validators """
+        compressed = zlib.compress(body.encode("utf-8"), self.COMPRESSION_LEVEL)
+        with self.lock:
+            self.connection.execute("INSERT OR REPLACE INTO responses (url, body, etag, last_modified, fetched) "
+                                    "VALUES (?, ?, ?, ?, ?)", (url, compressed, etag, last_modified, time.time()))
+            self.connection.commit()
+
+    def revalidated(self, url, etag=None, last_modified=None):
+        """ Records that the cached response of the given URL is still current, updating its validators if sent """
+        with self.lock:
+            self.revalidations += 1
+            self.connection.execute("UPDATE responses SET etag = COALESCE(?, etag), "
+                                    "last_modified = COALESCE(?, last_modified), fetched = ? WHERE url = ?",
+                                    (etag, last_modified, time.time(), url))
+            self.connection.commit()
+
+    def close(self):
+        """ Closes the cache file """
+        self.connection.close()
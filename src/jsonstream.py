@@ -0,0 +1,142 @@
+import json
+import re
+
+
+class Walker:
+    """ Walker is responsible for streaming the items of a single array nested deep inside a large JSON document, such
+    as the hits of a BLAST JSON report. The file is read in chunks and walked down the given path one token at a time,
+    and every item of the target array is decoded on its own, so memory is bounded by the largest item rather than by
+    the whole document. Members of the object holding the array are kept in siblings as they are walked past """
+
+    CHUNK_SIZE = 64 * 1024
+    WHITESPACE = " \t\n\r"
+    NUMBER = re.compile(r"[-+.0-9eE]*")  # characters a JSON number can hold
+
+    def __init__(self, path, keys, chunk_size=CHUNK_SIZE):
+        """
+        Constructor
+        :param str path: path to the JSON file
+        :param list keys: path to the array in the document, as object keys (str) and array indices (int)
+        :param int chunk_size: number of characters read from the file at once
+        """
+        self.path = path
+        self.keys = keys
+        self.chunk_size = chunk_size
+        self.siblings = {}
+        self._decoder = json.JSONDecoder()
+        self._file = None
+        self._buffer = ""
+        self._pos = 0
+        self._eof = False
+
+    def __iter__(self):
+        """
+        Yields the decoded items of the array at the walker path. Raises KeyError when the path does not exist in the
+        document and json.JSONDecodeError when the document is malformed
+        """
+        self.siblings = {}
+        with open(self.path, "r") as self._file:
+            self._buffer, self._pos, self._eof = "", 0, False
+            yield from self._walk(self.keys)
+
+    def _fill(self, size=None):
+        """ Reads the next chunk of the file into the buffer, dropping what has been consumed. Returns False at EOF """
+        if self._eof:
+            return False
+        chunk = self._file.read(size if size else self.chunk_size)
+        if not chunk:
+            self._eof = True
+            return False
+        self._buffer = self._buffer[self._pos:] + chunk
+        self._pos = 0
+        return True
+
+    def _peek(self):
+        """ Returns the next non-whitespace character without consuming it, or an empty string at EOF """
+        while True:
+            while self._pos < len(self._buffer) and self._buffer[self._pos] in self.WHITESPACE:
+                self._pos += 1
+            if self._pos < len(self._buffer) or not self._fill():
+                return self._buffer[self._pos:self._pos + 1]
+
+    def _expect(self, char):
+        """ Consumes the next non-whitespace character, raising KeyError if it is not the given one """
+        if self._peek() != char:
+            raise KeyError("expected '{}' at {} of {}".format(char, self._pos, self.path))
+        self._pos += 1
+
+    def _value(self):
+        """ Decodes and consumes the next complete JSON value, reading more of the file until the value is whole """
+        self._peek()
+        size = self.chunk_size
+        while True:
+            # a number that reaches the end of the buffer may go on in the next chunk, and a prefix of it such as "0."
+            # decodes to a truncated value, so it is only decoded once a character that cannot continue it is read
+            if self._eof or self.NUMBER.match(self._buffer, self._pos).end() < len(self._buffer):
+                try:
+                    value, self._pos = self._decoder.raw_decode(self._buffer, self._pos)
+                    return value
+                except json.JSONDecodeError:
+                    if self._eof:
+                        raise
+            self._fill(size)
+            size *= 2  # values larger than a chunk are decoded in a logarithmic number of attempts
+
+    def _members(self):
+        """ Yields the keys of the object being walked, leaving the position at the value of every key """
+        self._expect("{")
+        if self._peek() == "}":
+            self._pos += 1
+            return
+        while True:
+            key = self._value()
+            self._expect(":")
+            yield key
+            if self._peek() == ",":
+                self._pos += 1
+                continue
+            self._expect("}")
+            return
+
+    def _elements(self):
+        """ Yields the indices of the array being walked, leaving the position at every element """
+        self._expect("[")
+        if self._peek() == "]":
+            self._pos += 1
+            return
+        idx = 0
+        while True:
+            yield idx
+            if self._peek() == ",":
+                self._pos += 1
+                idx += 1
+                continue
+            self._expect("]")
+            return
+
+    def _walk(self, keys):
+        """ Walks down the given keys and yields the items of the array they lead to """
+        if not keys:
+            for _ in self._elements():
+                yield self._value()
+            return
+        found = False
+        target = keys[0]
+        if isinstance(target, int):
+            for idx in self._elements():
+                if idx == target:
+                    found = True
+                    yield from self._walk(keys[1:])
+                else:
+                    self._value()
+        else:
+            for key in self._members():
+                if key == target:
+                    found = True
+                    yield from self._walk(keys[1:])
+                elif len(keys) == 1:
+                    self.siblings[key] = self._value()  # members of the object holding the array
+                else:
+                    self._value()
+        if not found:
+            raise KeyError(target)
@@ -0,0 +1,218 @@
+import os
+from concurrent import futures
+
+import numpy as np
+
+from src import fasta
+
+BASES = "ACGT"
+INVALID = -1  # 2-bit code of any byte that is not an unambiguous nucleotide
+CODON_LEN = 3
+
+
+def _compare_file(path, k, sketch_k, sketch_size):
+    """ Compares the sequences of a single gene file, run by the worker processes of Composition.compare_files """
+    engine = Composition(k=k, sketch_k=sketch_k, sketch_size=sketch_size)
+    return os.path.basename(path), engine.compare(dict(fasta.Reader(path)))
+
+
+class GeneComposition:
+    """ The alignment-free (organisms x organisms) similarity and distance matrices of the sequences of a gene """
+
+    def __init__(self, orgs, kmer_cosine, codon_cosine, jaccard, mash_distance):
+        """
+        Constructor
+        :param list orgs: organisms of the rows and columns
+        :param kmer_cosine: cosine similarity of the k-mer count vectors
+        :param codon_cosine: cosine similarity of the in-frame codon count vectors
+        :param jaccard: Jaccard index of the k-mer sets estimated from their MinHash sketches
+        :param mash_distance: Mash distance derived from the estimated Jaccard index, inf for disjoint sketches
+        """
+        self.orgs = orgs
+        self.kmer_cosine = kmer_cosine
+        self.codon_cosine = codon_cosine
+        self.jaccard = jaccard
+        self.mash_distance = mash_distance
+
+
+class Composition:
+    """ Composition is responsible for the alignment-free comparison of the sequences in data/organisms. Sequences are
+    encoded on 2 bits per nucleotide, their k-mers are turned into integer codes with shifts over the whole sequence at
+    once and counted with np.bincount, and MinHash sketches of the k-mers estimate the Jaccard index of every pair of
+    sequences of a gene without aligning them """
+
+    def __init__(self, k=4, sketch_k=16, sketch_size=1000):
+        """
+        Constructor
+        :param int k: length of the counted k-mers, the count vectors have 4^k entries
+        :param int sketch_k: length of the sketched k-mers, at most 32 so that a k-mer fits in 64 bits
+        :param int sketch_size: number of hashes kept per bottom-k MinHash sketch
+        """
+        self.k = k
+        self.sketch_k = sketch_k
+        self.sketch_size = sketch_size
+        self.lookup = self._build_lookup()
+
+    def _build_lookup(self):
+        """ Builds a table that maps every byte to its 2-bit nucleotide code, or INVALID """
+        lookup = np.full(256, INVALID, dtype=np.int8)
+        for code, base in enumerate(BASES):
+            lookup[ord(base)] = code
+            lookup[ord(base.lower())] = code
+        return lookup
+
+    def encode(self, seq):
+        """ Encodes a sequence, as str or bytes, as an array of 2-bit nucleotide codes """
+        if isinstance(seq, str):
+            seq = seq.encode("ascii")
+        return self.lookup[np.frombuffer(seq, dtype=np.uint8)]
+
+    def kmer_codes(self, codes, k, step=1):
+        """
+        Builds the integer codes of the k-mers of an encoded sequence
+        :param codes: 2-bit nucleotide codes
+        :param int k: k-mer length
+        :param int step: distance between the starts of consecutive k-mers, e.g. 3 for in-frame codons
+        :return: uint64 array of the codes of the k-mers that do not hold an INVALID nucleotide
+        """
+        num_kmers = len(codes) - k + 1
+        if num_kmers <= 0:
+            return np.zeros(0, dtype=np.uint64)
+        kmers = np.zeros(num_kmers, dtype=np.uint64)
+        unsigned = codes.astype(np.uint64)
+        for offset in range(k):
+            kmers = (kmers << np.uint64(2)) | unsigned[offset:offset + num_kmers]
+        invalid = np.concatenate(([0], np.cumsum(codes == INVALID)))
+        valid = invalid[k:k + num_kmers] == invalid[:num_kmers]
+        return kmers[::step][valid[::step]]
+
+    def kmer_counts(self, seq, k=None):
+        """ Counts the overlapping k-mers of a sequence into a vector of 4^k counts """
+        k = k if k else self.k
+        return np.bincount(self.kmer_codes(self.encode(seq), k).astype(np.int64), minlength=4 ** k)
+
+    def codon_counts(self, seq):
+        """ Counts the in-frame codons of a sequence into a vector of 64 counts """
+        codes = self.kmer_codes(self.encode(seq), CODON_LEN, step=CODON_LEN)
+        return np.bincount(codes.astype(np.int64), minlength=4 ** CODON_LEN)
+
+    def cosine(self, counts):
+        """ Computes the cosine similarity of every pair of rows of a (sequences x features) count matrix """
+        counts = counts.astype(np.float64)
+        norms = np.linalg.norm(counts, axis=1)
+        normalized = counts / np.where(norms > 0, norms, 1)[:, None]
+        return (normalized @ normalized.T).astype(np.float32)
+
+    def _hash(self, values):
+        """ Mixes uint64 values with the splitmix64 finalizer, so that the bottom hashes are a uniform sample """
+        with np.errstate(over="ignore"):
+            values = values + np.uint64(0x9E3779B97F4A7C15)
+            values = (values ^ (values >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+            values = (values ^ (values >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+            return values ^ (values >> np.uint64(31))
+
+    def sketch(self, seq):
+        """ Builds the bottom-k MinHash sketch of the sketch_k-mers of a sequence, as a sorted uint64 array """
+        hashes = self._hash(self.kmer_codes(self.encode(seq), self.sketch_k))
+        candidates = 2 * self.sketch_size  # leaves room for repeated k-mers before sorting the whole sequence
+        if len(hashes) > candidates:
+            bottom = np.unique(np.partition(hashes, candidates - 1)[:candidates])
+            if len(bottom) >= self.sketch_size:
+                return bottom[:self.sketch_size]
+        return np.unique(hashes)[:self.sketch_size]
+
+    def jaccard(self, sketch1, sketch2):
+        """ Estimates the Jaccard index of two k-mer sets from their sketches, over the hashes up to the smaller of the
+        two sketch maxima, below which both sketches hold every hash of their k-mer set """
+        if not len(sketch1) or not len(sketch2):
+            return np.nan
+        threshold = min(sketch1[-1], sketch2[-1])
+        sketch1, sketch2 = sketch1[sketch1 <= threshold], sketch2[sketch2 <= threshold]
+        shared = len(np.intersect1d(sketch1, sketch2, assume_unique=True))
+        return shared / (len(sketch1) + len(sketch2) - shared)
+
+    def jaccard_matrix(self, sketches, chunk_size=16384):
+        """
+        Estimates the Jaccard index of every pair of sketches at once, see jaccard. The shared hashes of every pair are
+        counted with matrix products of the membership of the hashes, over chunks of hashes to bound memory
+        :param list sketches: sorted uint64 sketches
+        :param int chunk_size: number of distinct hashes per membership chunk
+        :return: float32 (sketches x sketches) matrix, NaN for empty sketches
+        """
+        num_sketches = len(sketches)
+        lengths = np.array([len(sketch) for sketch in sketches], dtype=np.int64)
+        hashes, inverse = np.unique(np.concatenate(sketches) if sketches else np.zeros(0, dtype=np.uint64),
+                                    return_inverse=True)
+        owners = np.repeat(np.arange(num_sketches), lengths)
+        shared = np.zeros((num_sketches, num_sketches))
+        for start in range(0, len(hashes), chunk_size):
+            selected = (inverse >= start) & (inverse < start + chunk_size)
+            membership = np.zeros((num_sketches, chunk_size), dtype=np.float32)
+            membership[owners[selected], inverse[selected] - start] = 1
+            shared += membership @ membership.T
+        # a sketch holds every hash of its set up to its maximum, so a pair is compared up to the smaller maximum,
+        # where the sketch with the smaller maximum is whole and the other one is cut
+        maxes = np.array([sketch[-1] if len(sketch) else 0 for sketch in sketches], dtype=np.uint64)
+        below = np.vstack([np.searchsorted(sketch, maxes, side="right") for sketch in sketches]) if sketches else \
+            np.zeros((0, 0), dtype=np.int64)  # below[j, i] is the number of hashes of sketch j up to the max of i
+        smaller = maxes[:, None] <= maxes[None, :]  # smaller[i, j] is whether the max of i is the threshold
+        sizes = np.where(smaller, lengths[:, None] + below.T, lengths[None, :] + below)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            jaccard = shared / (sizes - shared)
+        empty = lengths == 0
+        jaccard[empty, :] = np.nan
+        jaccard[:, empty] = np.nan
+        return jaccard.astype(np.float32)
+
+    def mash_distance(self, jaccard):
+        """ Turns Jaccard indices into Mash distances, an estimate of the per-nucleotide mutation rate """
+        with np.errstate(divide="ignore", invalid="ignore"):
+            return np.log((1 + jaccard) / (2 * jaccard)) / self.sketch_k
+
+    def compare(self, sequences):
+        """
+        Compares every pair of sequences of a gene
+        :param dict sequences: unaligned sequences keyed on organism
+        :return: GeneComposition
+        """
+        orgs = list(sequences.keys())
+        kmer_counts = np.vstack([self.kmer_counts(sequences.get(org)) for org in orgs]) if orgs else \
+            np.zeros((0, 4 ** self.k))
+        codon_counts = np.vstack([self.codon_counts(sequences.get(org)) for org in orgs]) if orgs else \
+            np.zeros((0, 4 ** CODON_LEN))
+        jaccard = self.jaccard_matrix([self.sketch(sequences.get(org)) for org in orgs])
+        return GeneComposition(orgs, self.cosine(kmer_counts), self.cosine(codon_counts), jaccard,
+                               self.mash_distance(jaccard).astype(np.float32))
+
+    def compare_files(self, dir_path=None, workers=1):
+        """
+        Compares the sequences of every gene file of a directory
+        :param str dir_path: directory of the gene files, defaults to src/data/organisms
+        :param int workers: number of worker processes, 1 compares in the current process, None uses all the CPUs
+        :return: dictionary of GeneComposition keyed on gene filename
+        """
+        dir_path = dir_path if dir_path else os.path.join(os.getcwd(), "src", "data", "organisms")
+        paths = [os.path.join(dir_path, filename) for filename in os.listdir(dir_path)]
+        args = (self.k, self.sketch_k, self.sketch_size)
+        if workers == 1:
+            return dict(_compare_file(path, *args) for path in paths)
+        with futures.ProcessPoolExecutor(max_workers=workers) as pool:
+            return dict(pool.map(_compare_file, paths, *[[arg] * len(paths) for arg in args]))
+
+    def save(self, compositions, path=None):
+        """ Saves the given comparisons in a single .npz file, with the organisms and matrices of every gene """
+        path = path if path else os.path.join(os.getcwd(), "src", "data", "organisms_composition.npz")
+        arrays = {}
+        for filename, composition in compositions.items():
+            gene = os.path.splitext(filename)[0]
+            arrays["{}/orgs".format(gene)] = np.array(composition.orgs)
+            arrays["{}/kmer_cosine".format(gene)] = composition.kmer_cosine
+            arrays["{}/codon_cosine".format(gene)] = composition.codon_cosine
+            arrays["{}/jaccard".format(gene)] = composition.jaccard
+            arrays["{}/mash_distance".format(gene)] = composition.mash_distance
+        np.savez_compressed(path, **arrays)
+
+
+if __name__ == "__main__":
+    composition = Composition()
+    composition.save(composition.compare_files(workers=None))
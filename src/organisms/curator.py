@@ -2,7 +2,7 @@ import csv
 import json
 import os
 
-from src import exceptions
+from src import exceptions, fasta
 
 
 class Curator:
@@ -122,11 +122,11 @@ class Curator:
         :param dict organisms: dictionary of organisms keyed on species
         """
         organisms_file_path = self._get_organisms_file_path(gene_name, gene_id)
-        with open(organisms_file_path, "w") as out:
+        with fasta.Writer(organisms_file_path) as writer:
             for species, sequence in organisms.items():
                 # no point in having the dashes (-) from the alignment as the seqs for Homo Sapiens get overwritten
                 # and we have to re-compute the pair-wise alignment again, anyway
-                out.write(">{}\n{}\n".format(species, sequence.replace("-", "")))
+                writer.write(species, sequence.replace("-", ""))
 
 
 if __name__ == "__main__":
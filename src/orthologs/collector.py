@@ -1,22 +1,35 @@
 import csv
-import requests
+import json
 import os
 
-from src import exceptions
+from src import exceptions, fetcher, httpcache
 
 
 class Collector:
     """ Calls Ensembl APIs to collect orthologue information for a collection of genes """
 
     GENE_ID_IDX = 1
+    ENSEMBL_URL = "https://rest.ensembl.org"
 
-    def __init__(self, gene_file_path):
+    def __init__(self, gene_file_path, base_url=ENSEMBL_URL, concurrency=4, rate=10, retries=5, use_cache=True,
+                 offline=False):
         """
         Constructor
         :param gene_file_path: path to the file containing gene names
+        :param str base_url: URL of the Ensembl REST API, e.g. a local stand-in server
+        :param int concurrency: number of requests to Ensembl in flight at once
+        :param float rate: maximum number of requests to Ensembl per second
+        :param int retries: number of times a failed request is retried
+        :param bool use_cache: whether to keep the Ensembl responses in data/http_cache.sqlite and revalidate them
+        :param bool offline: whether to only serve the responses from the cache, without calling Ensembl
         """
         self.gene_file_path = gene_file_path
+        self.base_url = base_url
         self.gene_ids = self.load()
+        cache_path = os.path.join(self._get_data_dir(), "http_cache.sqlite")
+        cache = httpcache.Cache(path=cache_path, offline=offline) if use_cache or offline else None
+        self.fetcher = fetcher.Fetcher(concurrency=concurrency, rate=rate, retries=retries,
+                                       headers={"content-type": "application/json"}, cache=cache)
 
     def load(self):
         """ Loads the genes in the class gene_ids """
@@ -32,24 +45,42 @@ class Collector:
         :return: Ensembl URL
         """
         # https://rest.ensembl.org/documentation/info/homology_ensemblgene
-        return "https://rest.ensembl.org/homology/id/{}?type=orthologues;sequence=dna;cigar_line=0".format(gene_id)
+        return "{}/homology/id/{}?type=orthologues;sequence=dna;cigar_line=0".format(self.base_url, gene_id)
+
+    def _get_data_dir(self):
+        """ Returns the data directory, the one holding the gene file """
+        return os.path.dirname(os.path.abspath(self.gene_file_path))
+
+    def _get_orthologs_dir(self):
+        """ Returns the directory of the orthologue files, data/orthologs next to the gene file """
+        return os.path.join(self._get_data_dir(), "orthologs")
 
     def collect(self):
-        """ Launches the collection of the orthologues """
-        headers = {"content-type": "application/json"}
-        for gene_id in self.gene_ids:
-            with open("{}.txt".format(gene_id), 'w') as out:
-                url = self.construct_ensembl_url(gene_id)
-                req = requests.get(url=url, headers=headers)
-                if req.status_code != 200:
-                    message = "Error calling Ensembl, expected status code 200, found: {}".format(req.status_code)
-                    raise exceptions.OrthologRequestException(message)
-                out.write(req.text)
-                self.format(out.name)
-
-    def format(self, gene_filename):
-        """ Invokes the json_formatter script with the given gene_filename """
-        os.system("bash json_formatter.sh {}".format(gene_filename))
+        """ Launches the collection of the orthologues. Genes are fetched concurrently and every gene that can be
+        fetched is written, failed genes are reported at the end """
+        urls = {gene_id: self.construct_ensembl_url(gene_id) for gene_id in self.gene_ids}
+        out_dir = self._get_orthologs_dir()
+        os.makedirs(out_dir, exist_ok=True)
+        failed = {}
+        for gene_id, text, error in self.fetcher.fetch_all(urls):
+            if error:
+                failed[gene_id] = error.status_code if error.status_code else error
+                continue
+            try:
+                formatted = self.format(text)
+            except ValueError as e:  # a body that is not JSON only fails its own gene
+                failed[gene_id] = "invalid JSON ({})".format(e)
+                continue
+            with open(os.path.join(out_dir, "{}.txt".format(gene_id)), 'w', encoding='utf-8') as out:
+                out.write(formatted)
+        if failed:
+            message = "Error calling Ensembl, expected status code 200 and a JSON body, found: {}".format(
+                ", ".join("{} for {}".format(reason, gene_id) for gene_id, reason in sorted(failed.items())))
+            raise exceptions.OrthologRequestException(message)
+
+    def format(self, text):
+        """ Pretty-prints the given JSON response, the same way as `jq .` """
+        return json.dumps(json.loads(text), indent=2, ensure_ascii=False) + "\n"
 
 
 if __name__ == "__main__":
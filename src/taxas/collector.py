@@ -1,11 +1,8 @@
 import csv
 import json
 import os
-import time
 
-import requests
-
-from src import exceptions
+from src import exceptions, fasta, fetcher, httpcache
 
 
 class Collector:
@@ -17,10 +14,15 @@ class Collector:
     FREQ_KEY = "freq"
     GENE_IDS_KEY = "genes"
 
-    def __init__(self):
+    def __init__(self, use_cache=True, offline=False):
         """
         Constructor
+        :param bool use_cache: whether to keep the EBI responses in data/http_cache.sqlite and revalidate them
+        :param bool offline: whether to only serve the responses from the cache, without calling EBI
         """
+        cache = httpcache.Cache(offline=offline) if use_cache or offline else None
+        # do not bombard EBI with 100s of API calls
+        self.fetcher = fetcher.Fetcher(concurrency=2, rate=5, cache=cache)
         self.parent_path = self._get_parent_path()
         self.gene_file_path = self._get_gene_file_path()
         self.gene_ids = self._load_genes()
@@ -53,24 +55,20 @@ class Collector:
         genes = {}
         for gene in self.gene_ids:
             org_file_path = self._get_organisms_file_path(gene[self.GENE_NAME_IDX], gene[self.GENE_ID_IDX])
-            with open(org_file_path, "r") as orgs:
-                org = orgs.read().splitlines()
-                genes[gene[self.GENE_NAME_IDX]] = {}
-                # we only care about unique organisms
-                for o in org:
-                    if not o.startswith(">"):
-                        continue
-                    clean_o = o.replace(">", "", 1).replace("_", " ").title()
-                    # I hate to do this but there's a special case for Canis Familiaris
-                    # EBI does not recognize it but it does recognize Canis Lupus (Canis Lupus Familiaris)
-                    if "Canis Familiaris" in clean_o:
-                        clean_o = "Canis lupus"
-                    if not organisms.get(clean_o):
-                        organisms[clean_o] = {self.FREQ_KEY: 1, self.GENE_IDS_KEY: [gene]}
-                    else:
-                        organisms[clean_o][self.FREQ_KEY] = organisms[clean_o][self.FREQ_KEY] + 1
-                        organisms[clean_o][self.GENE_IDS_KEY].append(gene)
-                    genes[gene[self.GENE_NAME_IDX]][clean_o] = 1
+            genes[gene[self.GENE_NAME_IDX]] = {}
+            # we only care about unique organisms
+            for o, _ in fasta.Reader(org_file_path):
+                clean_o = o.replace("_", " ").title()
+                # I hate to do this but there's a special case for Canis Familiaris
+                # EBI does not recognize it but it does recognize Canis Lupus (Canis Lupus Familiaris)
+                if "Canis Familiaris" in clean_o:
+                    clean_o = "Canis lupus"
+                if not organisms.get(clean_o):
+                    organisms[clean_o] = {self.FREQ_KEY: 1, self.GENE_IDS_KEY: [gene]}
+                else:
+                    organisms[clean_o][self.FREQ_KEY] = organisms[clean_o][self.FREQ_KEY] + 1
+                    organisms[clean_o][self.GENE_IDS_KEY].append(gene)
+                genes[gene[self.GENE_NAME_IDX]][clean_o] = 1
         return organisms, genes
 
     def get_gene_frequencies(self):
@@ -106,21 +104,22 @@ class Collector:
         with open(path, "w") as f:
             f.write("Kingdom,Subkingdom,Phylum,Clade,Subphylum,Clade,Class,Subclass,Superorder,Order,Suborder," +
                     "Subsuborder,Family,Genus,Species\n")
+            urls = {org: self._construct_ebi_taxon_url(org) for org in self.organisms.keys()}
+            fetched = {org: (text, error) for org, text, error in self.fetcher.fetch_all(urls)}
             for org in self.organisms.keys():
-                url = self._construct_ebi_taxon_url(org)
-                req = requests.get(url)
-                if req.status_code == 404:
+                text, error = fetched.get(org)
+                if error and error.status_code == 404:
                     print("Failed to find taxon information for organism: {}".format(org))
-                elif req.status_code != 200:
+                    continue
+                elif error:
                     message = "\nError calling EBI\n" + \
-                              "expected status code 200, found: {}\n" + \
-                              "address: {}\n" + \
-                              "org: {}".format(req.status_code, url, org)
+                              "expected status code 200, found: {}\n".format(error.status_code) + \
+                              "address: {}\n".format(urls.get(org)) + \
+                              "org: {}\n".format(org) + \
+                              "reason: {}".format(error)
                     raise exceptions.SpeciesRequestException(message)
-                parsed_req = json.loads(req.text)[0].get("lineage")  # single JSON object typically
+                parsed_req = json.loads(text)[0].get("lineage")  # single JSON object typically
                 f.write(self._format_organism_info(org, parsed_req))
-                # do not bombard EBI with 100s of API calls
-                time.sleep(0.200)
 
     def _construct_ebi_taxon_url(self, org):
         """ Constructs and returns the EBI url """
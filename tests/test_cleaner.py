@@ -0,0 +1,24 @@
+from src.dnds import cleaner
+
+
+def test_gap_inside_codon_drops_only_that_codon():
+    seq1 = "ATGAAACCCGGGTTT"
+    seq2 = "ATGA-ACCCGGGTTT"  # single-base deletion inside the second codon
+    seq1_clean, seq2_clean, positions = cleaner.Cleaner().clean_with_positions(seq1, seq2)
+    assert seq1_clean == "ATGCCCGGGTTT"
+    assert seq2_clean == "ATGCCCGGGTTT"
+    assert positions.tolist() == [0, 2, 3, 4]
+
+
+def test_downstream_codons_unchanged_by_gap():
+    seq1 = "ATGAAACCCGGGTTTTAC"
+    seq2 = "ATGAA-CCAGGCTTCTAT"
+    seq1_clean, seq2_clean = cleaner.Cleaner().clean(seq1, seq2)
+    assert [seq1_clean[i:i + 3] for i in range(0, len(seq1_clean), 3)] == ["ATG", "CCC", "GGG", "TTT", "TAC"]
+    assert [seq2_clean[i:i + 3] for i in range(0, len(seq2_clean), 3)] == ["ATG", "CCA", "GGC", "TTC", "TAT"]
+
+
+def test_ambiguous_base_and_trailing_partial_codon_are_dropped():
+    seq1 = "ATGNAACCCGG"
+    seq2 = "ATGAAACCCGG"
+    assert cleaner.Cleaner().clean(seq1, seq2) == ("ATGCCC", "ATGCCC")
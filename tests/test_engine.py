@@ -0,0 +1,27 @@
+import math
+
+import pytest
+
+from src.dnds import codons, engine
+
+
+@pytest.mark.parametrize("codon, degeneracy", [("GCT", [0, 0, 4]), ("AAA", [0, 0, 2]), ("ATT", [0, 0, 2]),
+                                               ("TTA", [2, 0, 2]), ("ATG", [0, 0, 0])])
+def test_degeneracy_classes(codon, degeneracy):
+    tables = codons.CodonTables.get(codons.GeneticCodes.STANDARD)
+    assert tables.degeneracy[tables.encode(codon)[0]].tolist() == degeneracy
+
+
+def test_li93_matches_hand_computed_ratio():
+    # 2 fourfold and 1 twofold synonymous transitions, and 1 nondegenerate transition, over L0=40, L2=10, L4=10 sites
+    seq1 = "GCT" * 10 + "AAA" * 10
+    seq2 = "GCC" * 2 + "ACT" + "GCT" * 7 + "AAG" + "AAA" * 9
+    ks = (-math.log(1 - 2 * 0.1) / 2 - math.log(1 - 2 * 0.2) / 2) / 2
+    ka = -math.log(1 - 2 * 1 / 40) / 2
+    assert engine.Li93().dnds(seq1, seq2) == pytest.approx(ka / ks)
+    assert engine.Li93().dnds(seq2, seq1) == pytest.approx(ka / ks)
+
+
+def test_li93_skips_stops_and_saturates_to_nan():
+    assert math.isnan(engine.Li93().dnds("GCTTAA", "GCTTAA"))  # no synonymous substitutions
+    assert math.isnan(engine.Li93().dnds("GCT" * 4, "GCA" * 4))  # fourfold transversions saturate K2P
@@ -0,0 +1,104 @@
+import collections
+import threading
+import time
+from http import server
+
+import pytest
+
+from src import exceptions, fetcher, httpcache
+
+ETAG = '"v1"'
+
+
+class StandInHandler(server.BaseHTTPRequestHandler):
+    """ Answers like a rate-limited REST API, by path, counting the requests made to every path """
+
+    counts = collections.Counter()
+
+    def do_GET(self):
+        self.counts[self.path] += 1
+        count = self.counts[self.path]
+        if self.path == "/rate-limited" and count == 1:
+            self._reply(429, b"slow down", {"Retry-After": "1"})
+        elif self.path == "/flaky" and count == 1:
+            self._reply(503, b"unavailable")
+        elif self.path == "/missing":
+            self._reply(404, b"not found")
+        elif self.path == "/truncated":
+            self.send_response(200)
+            self.send_header("Transfer-Encoding", "chunked")
+            self.end_headers()
+            self.wfile.write(b"100\r\npartial")  # the connection closes in the middle of the chunk
+            self.close_connection = True
+        elif self.path == "/etag" and self.headers.get("If-None-Match") == ETAG:
+            self._reply(304, b"", {"ETag": ETAG})
+        else:
+            self._reply(200, '["{}"]'.format(self.path).encode("utf-8"), {"ETag": ETAG})
+
+    def _reply(self, status, body, headers=None):
+        self.send_response(status)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def base_url():
+    StandInHandler.counts.clear()
+    httpd = server.ThreadingHTTPServer(("127.0.0.1", 0), StandInHandler)
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield "http://127.0.0.1:{}".format(httpd.server_address[1])
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def _fetcher(**kwargs):
+    return fetcher.Fetcher(concurrency=2, rate=100, retries=2, backoff=0.01, timeout=5, **kwargs)
+
+
+def test_honours_retry_after(base_url):
+    start = time.monotonic()
+    assert _fetcher().fetch(base_url + "/rate-limited") == '["/rate-limited"]'
+    assert time.monotonic() - start >= 0.9
+    assert StandInHandler.counts["/rate-limited"] == 2
+
+
+def test_retries_server_errors(base_url):
+    assert _fetcher().fetch(base_url + "/flaky") == '["/flaky"]'
+    assert StandInHandler.counts["/flaky"] == 2
+
+
+def test_not_found_is_not_retried(base_url):
+    with pytest.raises(exceptions.FetchException) as e:
+        _fetcher().fetch(base_url + "/missing")
+    assert e.value.status_code == 404
+    assert StandInHandler.counts["/missing"] == 1
+
+
+def test_failures_do_not_abort_other_urls(base_url):
+    urls = {key: base_url + "/" + key for key in ["ok", "missing", "truncated", "flaky"]}
+    results = {key: (body, error) for key, body, error in _fetcher().fetch_all(urls)}
+    assert results["ok"] == ('["/ok"]', None)
+    assert results["flaky"] == ('["/flaky"]', None)
+    assert results["missing"][1].status_code == 404
+    assert isinstance(results["truncated"][1], exceptions.FetchException)
+    assert StandInHandler.counts["/truncated"] == 3  # retried on the transport error
+
+
+def test_cache_revalidates_with_304(base_url, tmp_path):
+    cache = httpcache.Cache(path=str(tmp_path / "cache.sqlite"))
+    assert _fetcher(cache=cache).fetch(base_url + "/etag") == '["/etag"]'
+    assert _fetcher(cache=cache).fetch(base_url + "/etag") == '["/etag"]'
+    assert StandInHandler.counts["/etag"] == 2
+    assert cache.revalidations == 1
+    offline = httpcache.Cache(path=str(tmp_path / "cache.sqlite"), offline=True)
+    assert _fetcher(cache=offline).fetch(base_url + "/etag") == '["/etag"]'
+    assert StandInHandler.counts["/etag"] == 2
+    cache.close()
+    offline.close()
@@ -0,0 +1,38 @@
+import pytest
+
+from src.dnds import journal
+
+FINGERPRINT = "run"
+
+
+@pytest.mark.parametrize("cut", ["Acan\ta\tc\t1.", "Acan\ta\tc\t", "Acan\ta", "# en"])
+def test_replay_skips_gene_cut_off_by_killed_run(tmp_path, cut):
+    path = tmp_path / "journal.txt"
+    first = journal.Journal(path=str(path))
+    first.replay(FINGERPRINT)
+    first.append("Arsb", [("a", "b", 0.5), ("a", "c", 1.0)])
+    first.close()
+    with open(path, "a") as f:
+        f.write("Acan\ta\tb\t0.75\n" + cut)  # killed while journaling Acan
+
+    resumed = journal.Journal(path=str(path))
+    assert resumed.replay(FINGERPRINT) == {("Arsb", "a", "b"): 0.5, ("Arsb", "a", "c"): 1.0}
+    resumed.append("Acan", [("a", "b", 0.75), ("a", "c", 1.25)])
+    resumed.close()
+
+    replayed = journal.Journal(path=str(path))
+    assert replayed.replay(FINGERPRINT) == {
+        ("Arsb", "a", "b"): 0.5, ("Arsb", "a", "c"): 1.0, ("Acan", "a", "b"): 0.75, ("Acan", "a", "c"): 1.25,
+    }
+    replayed.close()
+
+
+def test_replay_discards_journal_of_other_run(tmp_path):
+    path = tmp_path / "journal.txt"
+    first = journal.Journal(path=str(path))
+    first.replay(FINGERPRINT)
+    first.append("Arsb", [("a", "b", 0.5)])
+    first.close()
+    other = journal.Journal(path=str(path))
+    assert other.replay("other run") == {}
+    other.close()
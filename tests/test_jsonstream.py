@@ -0,0 +1,29 @@
+import json
+
+import pytest
+
+from src import jsonstream
+
+DOCUMENT = {
+    "report": {
+        "program": "blastn",
+        "hits": [0.0025, 1e-5, -12.5E+3, {"score": 3.25, "title": "hit 1"}, 7, [0.5, 10], "text", True, None],
+        "version": 2.5,
+    },
+}
+
+
+@pytest.mark.parametrize("chunk_size", [1, 2, 3, 4, 5, 7, 16, jsonstream.Walker.CHUNK_SIZE])
+def test_walker_decodes_floats_split_across_chunks(tmp_path, chunk_size):
+    path = tmp_path / "document.json"
+    path.write_text(json.dumps(DOCUMENT))
+    walker = jsonstream.Walker(str(path), ["report", "hits"], chunk_size=chunk_size)
+    assert list(walker) == DOCUMENT["report"]["hits"]
+    assert walker.siblings == {"program": "blastn", "version": 2.5}
+
+
+@pytest.mark.parametrize("chunk_size", [1, 3])
+def test_walker_decodes_top_level_array_of_floats(tmp_path, chunk_size):
+    path = tmp_path / "document.json"
+    path.write_text('{"x":[0.0025]}')
+    assert list(jsonstream.Walker(str(path), ["x"], chunk_size=chunk_size)) == [0.0025]